@@ -0,0 +1,118 @@
+#!/usr/bin/env python
+#coding=utf-8
+'''
+Copyright (c) 2026 the s3_rest_py contributors
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+Created on 2026-10-16
+
+@author: s3_rest_py contributors
+'''
+
+import multiprocessing
+import time
+try:
+    import resource
+except ImportError:
+    resource = None
+
+from s3 import S3Bucket, S3Object, AmazonUser, S3Client
+from utils import XML
+
+__author__ = "s3_rest_py contributors"
+__description__ = "benchmark of parsing the bucket listing, run: python bench_parse.py"
+
+def _get_list_bucket_sample(keys):
+    contents = ''.join('<Contents><Key>folder/file-%06d.txt</Key>'
+                       '<LastModified>2012-04-18T08:00:00.000Z</LastModified>'
+                       '<ETag>&quot;%032x&quot;</ETag><Size>%d</Size>'
+                       '<Owner><ID>%s</ID><DisplayName>owner</DisplayName></Owner>'
+                       '<StorageClass>STANDARD</StorageClass></Contents>'
+                       % (i, i, i * 1024, 'a' * 64) for i in range(keys))
+    return '<?xml version="1.0" encoding="UTF-8"?>' \
+           '<ListBucketResult xmlns="http://s3.amazonaws.com/doc/2006-03-01/">' \
+           '<Name>bucket</Name><Prefix>folder/</Prefix><Marker></Marker>' \
+           '<MaxKeys>%d</MaxKeys><IsTruncated>true</IsTruncated>%s</ListBucketResult>' % (keys, contents)
+
+def _parse_get_bucket_by_tree(data):
+    # the former way, build the whole tree and find each item of the mapping
+    tree = XML.loads(data)
+    bucket = S3Bucket()
+    for k, v in S3Bucket.mapping.iteritems():
+        tag = tree.find(v)
+        if hasattr(tag, 'text'):
+            setattr(bucket, k, tag.text)
+
+    objs = []
+    for ele in tree.findall('Contents'):
+        obj = S3Object()
+        for k, v in S3Object.mapping.iteritems():
+            tag = ele.find(v)
+            if hasattr(tag, 'text'):
+                setattr(obj, k, tag.text)
+        owner = ele.find('Owner')
+        if owner is not None:
+            obj.owner = AmazonUser()
+            for k, v in AmazonUser.mapping.iteritems():
+                tag = owner.find(v)
+                if hasattr(tag, 'text'):
+                    setattr(obj.owner, k, tag.text)
+        obj.bucket = bucket
+        objs.append(obj)
+    return objs
+
+def _parse_get_bucket_by_stream(data):
+    return S3Client('', '')._parse_get_bucket(data)[0]
+
+def _get_peak_memory():
+    # KB, None where unknown, such as on Windows
+    if resource is None:
+        return None
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+def _measure_parse(parse, data, rounds, conn):
+    before = _get_peak_memory()
+    start = time.time()
+    for _ in range(rounds):
+        parse(data)
+    elapsed = (time.time() - start) / rounds
+    conn.send((elapsed, 'n/a' if before is None else _get_peak_memory() - before))
+
+def benchmark(keys=1000, rounds=20):
+    '''
+    Compare parsing a page of the bucket listing by the tree with parsing by the stream,
+    in time and in peak memory, each measured in a new process.
+    The peak memory is only measured where the resource module exists, not on Windows.
+    '''
+
+    data = _get_list_bucket_sample(keys)
+    by_tree = _parse_get_bucket_by_tree(data)
+    by_stream = _parse_get_bucket_by_stream(data)
+    assert [(o.key, o.etag, int(o.size), o.owner.id_) for o in by_tree] == \
+           [(o.key, o.etag, o.size, o.owner.id_) for o in by_stream]
+
+    results = []
+    for parse in (_parse_get_bucket_by_tree, _parse_get_bucket_by_stream):
+        parent, child = multiprocessing.Pipe()
+        process = multiprocessing.Process(target=_measure_parse, args=(parse, data, rounds, child))
+        process.start()
+        results.append(parent.recv())
+        process.join()
+
+    print '%d keys, %d KB: tree %.1f ms, %s KB peak; stream %.1f ms, %s KB peak; %.1fx faster' % (
+        keys, len(data) / 1024, results[0][0] * 1000, results[0][1],
+        results[1][0] * 1000, results[1][1], results[0][0] / results[1][0])
+
+if __name__ == '__main__':
+    benchmark()
@@ -0,0 +1,294 @@
+#!/usr/bin/env python
+#coding=utf-8
+'''
+Copyright (c) 2026 the s3_rest_py contributors
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+Created on 2026-10-16
+
+@author: s3_rest_py contributors
+'''
+
+from collections import OrderedDict
+from hashlib import md5
+import itertools
+import os
+import threading
+import time
+
+__author__ = "s3_rest_py contributors"
+__description__ = "bounded LRU caches of the objects got, in memory or on disk."
+
+class CacheEntry(object):
+    '''
+    An object cached, with the headers to revalidate it,
+    data is the content, or where the content is kept.
+    '''
+
+    __slots__ = ('size', 'headers', 'stored_time', 'data')
+
+    def __init__(self, size, headers, data=None):
+        self.size = size
+        self.headers = headers
+        self.stored_time = time.time()
+        self.data = data
+
+    @property
+    def etag(self):
+        return self.headers.get('etag')
+
+    @property
+    def last_modified(self):
+        return self.headers.get('last-modified')
+
+class ObjectCache(object):
+    '''
+    A thread safe LRU cache of the objects' content in memory, bounded by the total bytes.
+    The least recently used objects are evicted when a new one doesn't fit.
+
+    Usage:
+    client = S3Client('your_access_key', 'your_secret_access_key',
+                      cache=ObjectCache(64*1024*1024))
+
+    The client revalidates a cached object by If-None-Match and If-Modified-Since,
+    and serves the cached content if the server answers 304 Not Modified.
+    With ttl, an object cached for less than ttl seconds is served without revalidated.
+    '''
+
+    def __init__(self, max_bytes=64*1024*1024, ttl=None):
+        '''
+        :param max_bytes: max total size of the content cached, a larger object isn't cached.
+        :param ttl: seconds an object is served without revalidated, None to always revalidate.
+        '''
+
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> CacheEntry, the least recently used first
+        self._bytes = 0
+        self._versions = {}  # key -> version, increased by each remove of the key
+        self._cleared = 0  # increased by each clear, which resets the versions
+
+    # _store, _load and _drop are called out of the lock
+
+    def _store(self, key, entry, data):
+        entry.data = data
+
+    def _load(self, key, entry):
+        return entry.data
+
+    def _drop(self, key, entry):
+        entry.data = None
+
+    def _pop(self, key):
+        # called in the lock, the entry returned is to drop after the lock released
+        entry = self._entries.pop(key)
+        self._bytes -= entry.size
+        return entry
+
+    def get(self, key):
+        '''
+        :return: the (entry, content) of the key, None if not cached.
+        '''
+
+        self._lock.acquire()
+        try:
+            entry = self._entries.pop(key, None)
+            if entry is None:
+                return None
+            self._entries[key] = entry
+        finally:
+            self._lock.release()
+
+        # loaded out of the lock, for it may read a file
+        data = self._load(key, entry)
+        if data is None:
+            # such as the file removed
+            self._lock.acquire()
+            try:
+                dropped = self._entries.get(key) is entry
+                if dropped:
+                    self._pop(key)
+            finally:
+                self._lock.release()
+            if dropped:
+                self._drop(key, entry)
+            return None
+        return entry, data
+
+    def get_version(self, key):
+        '''
+        :return: the version of the key, changed by each remove of the key,
+                 get it before fetching the object, and pass it to put.
+        '''
+
+        self._lock.acquire()
+        try:
+            return self._cleared, self._versions.get(key, 0)
+        finally:
+            self._lock.release()
+
+    def is_fresh(self, entry):
+        return self.ttl is not None and time.time() - entry.stored_time < self.ttl
+
+    def touch(self, entry):
+        '''
+        The entry is revalidated, it's fresh from now on.
+        '''
+
+        entry.stored_time = time.time()
+
+    def put(self, key, data, headers, version=None):
+        '''
+        :param version: the result of get_version before the object fetched,
+                        if the key removed since then, such as the object written,
+                        the content may be stale, and it isn't cached.
+        '''
+
+        size = len(data)
+        entry = CacheEntry(size, headers)
+        if size <= self.max_bytes:
+            self._store(key, entry, data)
+
+        dropped = []
+        self._lock.acquire()
+        try:
+            if version is not None and version != (self._cleared, self._versions.get(key, 0)):
+                if size <= self.max_bytes:
+                    dropped.append((key, entry))
+            elif size > self.max_bytes:
+                # not cached, but the content cached before is older than it
+                if key in self._entries:
+                    dropped.append((key, self._pop(key)))
+            else:
+                if key in self._entries:
+                    dropped.append((key, self._pop(key)))
+                while self._entries and self._bytes + size > self.max_bytes:
+                    old_key = next(iter(self._entries))
+                    dropped.append((old_key, self._pop(old_key)))
+
+                self._entries[key] = entry
+                self._bytes += size
+        finally:
+            self._lock.release()
+
+        for old_key, old_entry in dropped:
+            self._drop(old_key, old_entry)
+
+    def remove(self, key):
+        entry = None
+        self._lock.acquire()
+        try:
+            self._versions[key] = self._versions.get(key, 0) + 1
+            if key in self._entries:
+                entry = self._pop(key)
+        finally:
+            self._lock.release()
+
+        if entry is not None:
+            self._drop(key, entry)
+
+    def clear(self):
+        self._lock.acquire()
+        try:
+            self._cleared += 1
+            self._versions = {}
+            entries, self._entries, self._bytes = self._entries, OrderedDict(), 0
+        finally:
+            self._lock.release()
+
+        for key, entry in entries.iteritems():
+            self._drop(key, entry)
+
+class DiskObjectCache(ObjectCache):
+    '''
+    Almost like ObjectCache, but the content is kept in the files of a directory,
+    so the cache can be much larger than the memory.
+    Only the index is in memory, the files left by a former process are removed.
+    Each entry has it's own file, so a file is never rewritten while read.
+    A file can't be removed while read on Windows, it's removed again later.
+    '''
+
+    def __init__(self, path, max_bytes=1024*1024*1024, ttl=None):
+        super(DiskObjectCache, self).__init__(max_bytes, ttl)
+
+        self.path = path
+        self._counter = itertools.count(1)
+        self._removing_lock = threading.Lock()
+        self._removing = []  # the files dropped but failed to remove
+        if not os.path.exists(path):
+            os.makedirs(path)
+        for filename in os.listdir(path):
+            if filename.endswith('.cache'):
+                os.remove(os.path.join(path, filename))
+
+    def _store(self, key, entry, data):
+        self._remove_dropped()
+
+        filename = os.path.join(self.path, '%s-%d.cache' % (md5(repr(key)).hexdigest(),
+                                                            next(self._counter)))
+
+        fp = open(filename, 'wb')
+        try:
+            fp.write(data)
+        finally:
+            fp.close()
+        entry.data = filename
+
+    def _load(self, key, entry):
+        try:
+            fp = open(entry.data, 'rb')
+        except IOError:
+            return None
+        try:
+            return fp.read()
+        finally:
+            fp.close()
+
+    def _remove(self, filename):
+        '''
+        :return: False if the file exists but can't be removed.
+        '''
+
+        try:
+            os.remove(filename)
+        except OSError:
+            return not os.path.exists(filename)
+        return True
+
+    def _drop(self, key, entry):
+        if not self._remove(entry.data):
+            self._removing_lock.acquire()
+            try:
+                self._removing.append(entry.data)
+            finally:
+                self._removing_lock.release()
+
+    def _remove_dropped(self):
+        self._removing_lock.acquire()
+        try:
+            removing, self._removing = self._removing, []
+        finally:
+            self._removing_lock.release()
+        if not removing:
+            return
+
+        left = [filename for filename in removing if not self._remove(filename)]
+        if left:
+            self._removing_lock.acquire()
+            try:
+                self._removing.extend(left)
+            finally:
+                self._removing_lock.release()
@@ -0,0 +1,301 @@
+#!/usr/bin/env python
+#coding=utf-8
+'''
+Copyright (c) 2026 the s3_rest_py contributors
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+Created on 2026-10-16
+
+@author: s3_rest_py contributors
+'''
+
+import datetime
+import sqlite3
+import threading
+
+__author__ = "s3_rest_py contributors"
+__description__ = "durable watermarks of the incremental loading and ranges of the backfill, kept in sqlite."
+
+DATETIME_FORMAT = '%Y-%m-%d %H:%M:%S.%f'
+
+def _dump(value):
+    if isinstance(value, datetime.datetime):
+        return 'datetime', value.strftime(DATETIME_FORMAT)
+    return None, value
+
+def _dump_id(value):
+    # not null, for the nulls in a primary key are all different in sqlite
+    kind, value = _dump(value)
+    return kind or '', value
+
+def _load(kind, value):
+    if kind == 'datetime':
+        return datetime.datetime.strptime(value, DATETIME_FORMAT)
+    return value
+
+class CheckpointStore(object):
+    '''
+    Keep the watermark (last modified time, id) of the rows loaded, for each name,
+    the ranges of the backfill with whether each is done,
+    and the rows failed with the count of failures, the dead ones are given up.
+    Each update is a sqlite transaction, so nothing is half written,
+    and the store can be shared by the threads.
+
+    Usage:
+    store = CheckpointStore('checkpoint.db')
+    store.set('my_table', (modified_time, row_id))
+    modified_time, row_id = store.get('my_table')
+    '''
+
+    def __init__(self, filename):
+        self.filename = filename
+        self._lock = threading.Lock()
+
+        self._conn = sqlite3.connect(filename, check_same_thread=False)
+        self._conn.text_factory = str
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('''create table if not exists watermark (
+                                  name text primary key,
+                                  time_kind text, time_value,
+                                  id_kind text, id_value)''')
+        self._conn.execute('''create table if not exists backfill_range (
+                                  name text, range_no integer,
+                                  low_kind text, low_value,
+                                  high_kind text, high_value,
+                                  done integer,
+                                  primary key (name, range_no))''')
+        self._conn.execute('''create table if not exists failed_row (
+                                  name text,
+                                  id_kind text, id_value,
+                                  failures integer, error text, dead integer,
+                                  primary key (name, id_kind, id_value))''')
+        self._conn.commit()
+
+    def get(self, name):
+        '''
+        :return: the watermark (time, id) of the name, None if not set.
+        '''
+
+        self._lock.acquire()
+        try:
+            row = self._conn.execute('select time_kind, time_value, id_kind, id_value '
+                                     'from watermark where name = ?', (name, )).fetchone()
+        finally:
+            self._lock.release()
+
+        if row is None:
+            return None
+        return _load(row[0], row[1]), _load(row[2], row[3])
+
+    def set(self, name, watermark):
+        self._lock.acquire()
+        try:
+            self._conn.execute('insert or replace into watermark values (?, ?, ?, ?, ?)',
+                               (name, ) + _dump(watermark[0]) + _dump(watermark[1]))
+            self._conn.commit()
+        finally:
+            self._lock.release()
+
+    def get_ranges(self, name):
+        '''
+        :return: the list of (range_no, low, high, done) of the name.
+        '''
+
+        self._lock.acquire()
+        try:
+            rows = self._conn.execute('select range_no, low_kind, low_value, high_kind, high_value, done '
+                                      'from backfill_range where name = ? order by range_no',
+                                      (name, )).fetchall()
+        finally:
+            self._lock.release()
+
+        return [(row[0], _load(row[1], row[2]), _load(row[3], row[4]), bool(row[5]))
+                for row in rows]
+
+    def set_ranges(self, name, ranges):
+        '''
+        Replace the ranges of the name, all not done.
+
+        :param ranges: the list of (low, high).
+        '''
+
+        self._lock.acquire()
+        try:
+            self._conn.execute('delete from backfill_range where name = ?', (name, ))
+            for range_no, (low, high) in enumerate(ranges):
+                self._conn.execute('insert into backfill_range values (?, ?, ?, ?, ?, ?, 0)',
+                                   (name, range_no) + _dump(low) + _dump(high))
+            self._conn.commit()
+        finally:
+            self._lock.release()
+
+    def finish_range(self, name, range_no):
+        self._lock.acquire()
+        try:
+            self._conn.execute('update backfill_range set done = 1 where name = ? and range_no = ?',
+                               (name, range_no))
+            self._conn.commit()
+        finally:
+            self._lock.release()
+
+    def add_failure(self, name, row_id, error):
+        '''
+        Count a failure of the row.
+
+        :return: the count of the failures of the row.
+        '''
+
+        key = (name, ) + _dump_id(row_id)
+        self._lock.acquire()
+        try:
+            self._conn.execute('insert or ignore into failed_row values (?, ?, ?, 0, null, 0)', key)
+            self._conn.execute('update failed_row set failures = failures + 1, error = ? '
+                               'where name = ? and id_kind = ? and id_value = ?', (error, ) + key)
+            row = self._conn.execute('select failures from failed_row '
+                                     'where name = ? and id_kind = ? and id_value = ?', key).fetchone()
+            self._conn.commit()
+        finally:
+            self._lock.release()
+
+        return row[0]
+
+    def set_dead(self, name, row_id):
+        '''
+        Give up the row, it's kept as a dead letter.
+        '''
+
+        self._lock.acquire()
+        try:
+            self._conn.execute('update failed_row set dead = 1 '
+                               'where name = ? and id_kind = ? and id_value = ?',
+                               (name, ) + _dump_id(row_id))
+            self._conn.commit()
+        finally:
+            self._lock.release()
+
+    def clear_failure(self, name, row_id):
+        self._lock.acquire()
+        try:
+            self._conn.execute('delete from failed_row where name = ? and id_kind = ? and id_value = ?',
+                               (name, ) + _dump_id(row_id))
+            self._conn.commit()
+        finally:
+            self._lock.release()
+
+    def get_failures(self, name, dead=None):
+        '''
+        :param dead: True for the dead rows only, False for the rows not dead, None for all.
+
+        :return: the list of (id, failures, error, dead) of the rows failed.
+        '''
+
+        sql = 'select id_kind, id_value, failures, error, dead from failed_row where name = ?'
+        params = (name, )
+        if dead is not None:
+            sql += ' and dead = ?'
+            params += (int(dead), )
+
+        self._lock.acquire()
+        try:
+            rows = self._conn.execute(sql, params).fetchall()
+        finally:
+            self._lock.release()
+
+        return [(_load(row[0], row[1]), row[2], row[3], bool(row[4])) for row in rows]
+
+    def close(self):
+        self._lock.acquire()
+        try:
+            self._conn.close()
+        finally:
+            self._lock.release()
+
+class Watermark(object):
+    '''
+    Track the rows fetched in order and finished out of order,
+    the watermark only moves to the last row that all the rows before it finished,
+    and it's saved into the store each time it moves.
+    A row never finished, such as failed, holds the watermark,
+    so that it and the rows after it are loaded again next time.
+    With max_failures, a row failed that many times is given up as dead,
+    it's kept in the store and the watermark moves past it.
+    '''
+
+    def __init__(self, store, name, watermark=None, max_failures=None):
+        self.store = store
+        self.name = name
+        self.watermark = watermark
+        self.max_failures = max_failures
+
+        self._lock = threading.Lock()
+        self._next_seq = 0
+        self._committed_seq = 0
+        self._finished = {}  # seq -> watermark of the finished rows not committed
+        # the ids of the rows failed before, to clear when they succeed
+        self._failed_ids = set(row[0] for row in store.get_failures(name, dead=False))
+
+    def add(self):
+        '''
+        :return: the sequence of the row fetched.
+        '''
+
+        self._lock.acquire()
+        try:
+            seq = self._next_seq
+            self._next_seq += 1
+            return seq
+        finally:
+            self._lock.release()
+
+    def finish(self, seq, watermark, row_id=None):
+        '''
+        :param row_id: the id of the row, it's failures are cleared if it failed before.
+        '''
+
+        if row_id is not None and row_id in self._failed_ids:
+            self.store.clear_failure(self.name, row_id)
+
+        self._lock.acquire()
+        try:
+            self._finished[seq] = watermark
+
+            moved = False
+            while self._committed_seq in self._finished:
+                self.watermark = self._finished.pop(self._committed_seq)
+                self._committed_seq += 1
+                moved = True
+
+            if moved:
+                self.store.set(self.name, self.watermark)
+        finally:
+            self._lock.release()
+
+    def fail(self, seq, watermark, row_id, error):
+        '''
+        Count a failure of the row, if it failed max_failures times,
+        it's set dead in the store and finished.
+
+        :return: True if the row is given up.
+        '''
+
+        if self.max_failures is None:
+            return False
+
+        failures = self.store.add_failure(self.name, row_id, error)
+        if failures < self.max_failures:
+            return False
+
+        self.store.set_dead(self.name, row_id)
+        self.finish(seq, watermark)
+        return True
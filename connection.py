@@ -0,0 +1,155 @@
+#!/usr/bin/env python
+#coding=utf-8
+'''
+Copyright (c) 2026 the s3_rest_py contributors
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+Created on 2026-10-16
+
+@author: s3_rest_py contributors
+'''
+
+import httplib
+import select
+import socket
+import threading
+import time
+
+__author__ = "s3_rest_py contributors"
+__description__ = "keep-alive http connection pool, connections are kept per host."
+
+class PoolExhausted(Exception):
+    '''
+    Raised by HTTPConnectionPool.get without blocking, when no connection to the host is free.
+    '''
+
+class HTTPConnectionPool(object):
+    '''
+    A thread safe pool of keep-alive http connections, grouped by host.
+
+    Usage:
+    pool = HTTPConnectionPool(max_connections=10, idle_timeout=60)
+    conn = pool.get('my_bucket.s3.amazonaws.com')
+    try:
+        conn.request('GET', '/my_obj')
+        resp = conn.getresponse()
+        data = resp.read()
+    except:
+        pool.release(conn, reuse=False)
+        raise
+    pool.release(conn, reuse=not resp.will_close)
+    '''
+
+    def __init__(self, max_connections=10, idle_timeout=60, timeout=None):
+        '''
+        :param max_connections: max connections opened to one host at the same time,
+                                pool.get blocks when the limit is reached, unless told not to.
+        :param idle_timeout: seconds a connection may stay idle in the pool before dropped.
+        :param timeout: socket timeout of the connections, None means the global default.
+        '''
+
+        self.max_connections = max_connections
+        self.idle_timeout = idle_timeout
+        self.timeout = timeout
+
+        self._cond = threading.Condition()
+        self._idle = {}    # host -> list of (connection, last used time)
+        self._opened = {}  # host -> count of the connections opened, in use or idle
+
+    def _is_alive(self, conn):
+        # An idle keep-alive socket should have nothing to read,
+        # if it's readable, the server has closed it or sent something unexpected.
+        if conn.sock is None:
+            return False
+        try:
+            readable = select.select([conn.sock], [], [], 0)[0]
+        except (select.error, socket.error, ValueError):
+            return False
+        return not readable
+
+    def _discard(self, host, conn):
+        conn.close()
+        self._opened[host] -= 1
+
+    def get(self, host, block=True):
+        '''
+        Borrow a connection to the host, reuse an idle one if it's still healthy.
+        The connection must be given back by `release`.
+
+        :param block: wait for a connection released if max_connections are in use,
+                      else PoolExhausted is raised at once.
+        '''
+
+        self._cond.acquire()
+        try:
+            while True:
+                idle = self._idle.get(host)
+                while idle:
+                    conn, last_used = idle.pop()
+                    if time.time() - last_used > self.idle_timeout or \
+                        not self._is_alive(conn):
+                        self._discard(host, conn)
+                        continue
+                    conn.reused = True
+                    return conn
+
+                if self._opened.get(host, 0) < self.max_connections:
+                    self._opened[host] = self._opened.get(host, 0) + 1
+                    break
+                if not block:
+                    raise PoolExhausted('All the %d connections to %s are in use.'
+                                        % (self.max_connections, host))
+                self._cond.wait()
+        finally:
+            self._cond.release()
+
+        if self.timeout is None:
+            conn = httplib.HTTPConnection(host)
+        else:
+            conn = httplib.HTTPConnection(host, timeout=self.timeout)
+        conn.host_key = host
+        conn.reused = False
+        return conn
+
+    def release(self, conn, reuse=True):
+        '''
+        Give back the connection borrowed from the pool.
+
+        :param reuse: False if the connection is broken or the server will close it,
+                      the response must be read completely before released with reuse.
+        '''
+
+        self._cond.acquire()
+        try:
+            if reuse and conn.sock is not None:
+                self._idle.setdefault(conn.host_key, []).append((conn, time.time()))
+            else:
+                self._discard(conn.host_key, conn)
+            self._cond.notify()
+        finally:
+            self._cond.release()
+
+    def close(self):
+        '''
+        Close all the idle connections.
+        '''
+
+        self._cond.acquire()
+        try:
+            for host, idle in self._idle.iteritems():
+                for conn, _ in idle:
+                    self._discard(host, conn)
+            self._idle = {}
+        finally:
+            self._cond.release()
@@ -20,10 +20,68 @@ Created on 2012-4-20
 @author: Chine
 '''
 
-import pyDes
+import multiprocessing
+import os
+import struct
+
+import fastdes
 
 __author__ = "Chine King"
-__description__ = "crypto modules, DES requires for pyDes."
+__description__ = "crypto modules, DES requires for fastdes, which outputs the same as pyDes."
+
+class DESEncryptor(object):
+    '''
+    Encrypt the data chunk by chunk, the CBC state is kept between the chunks,
+    and the PKCS5 padding is added by final.
+    The output is the same as DES.encrypt of all the data.
+    '''
+
+    def __init__(self, IV):
+        self.des = fastdes.des("DESCRYPT", fastdes.CBC, IV, pad=None, padmode=fastdes.PAD_PKCS5)
+        self.buf = ''
+
+    def update(self, data):
+        data = self.buf + data
+        size = len(data) - len(data) % 8
+        self.buf = data[size:]
+        if size == 0:
+            return ''
+
+        encrypted = self.des.crypt(data[:size], fastdes.ENCRYPT)
+        self.des.setIV(encrypted[-8:])
+        return encrypted
+
+    def final(self):
+        data, self.buf = self.buf, ''
+        return self.des.encrypt(data)
+
+class DESDecryptor(object):
+    '''
+    Decrypt the data chunk by chunk, the CBC state is kept between the chunks,
+    the last block is held until final, which removes the PKCS5 padding.
+    The output is the same as DES.decrypt of all the data.
+    '''
+
+    def __init__(self, IV):
+        self.des = fastdes.des("DESCRYPT", fastdes.CBC, IV, pad=None, padmode=fastdes.PAD_PKCS5)
+        self.buf = ''
+
+    def update(self, data):
+        data = self.buf + data
+        size = max(0, (len(data) - 1) // 8 * 8)
+        self.buf = data[size:]
+        if size == 0:
+            return ''
+
+        decrypted = self.des.crypt(data[:size], fastdes.DECRYPT)
+        self.des.setIV(data[size-8:size])
+        return decrypted
+
+    def final(self):
+        data, self.buf = self.buf, ''
+        if data and len(data) != 8:
+            raise ValueError("Invalid data length, data must be a multiple of 8 bytes.")
+        return self.des.decrypt(data)
 
 class DES(object):
     def __init__(self, IV):
@@ -35,10 +93,213 @@ class DES(object):
         assert len(IV) == 8
         
         self.IV = IV
-        self.des = pyDes.des("DESCRYPT", pyDes.CBC, self.IV, pad=None, padmode=pyDes.PAD_PKCS5)
+        self.des = fastdes.des("DESCRYPT", fastdes.CBC, self.IV, pad=None, padmode=fastdes.PAD_PKCS5)
         
     def encrypt(self, data):
         return self.des.encrypt(data)
         
     def decrypt(self, data):
-        return self.des.decrypt(data)
\ No newline at end of file
+        return self.des.decrypt(data)
+
+    def encrypt_chunks(self, chunks):
+        '''
+        Encrypt the chunks from an iterator, and yield the encrypted chunks.
+        '''
+
+        encryptor = DESEncryptor(self.IV)
+        for chunk in chunks:
+            encrypted = encryptor.update(chunk)
+            if encrypted:
+                yield encrypted
+        yield encryptor.final()
+
+    def decrypt_chunks(self, chunks):
+        '''
+        Decrypt the chunks from an iterator, and yield the decrypted chunks.
+        '''
+
+        decryptor = DESDecryptor(self.IV)
+        for chunk in chunks:
+            decrypted = decryptor.update(chunk)
+            if decrypted:
+                yield decrypted
+        yield decryptor.final()
+
+SEGMENT_MAGIC = 'S3DESSEG'
+SEGMENT_HEADER = '>8sI'
+SEGMENT_HEADER_SIZE = struct.calcsize(SEGMENT_HEADER)
+SEGMENT_SIZE = 1024 * 1024
+
+def _encrypt_segment(args):
+    key, IV, data, last = args
+    des = fastdes.des(key, fastdes.CBC, IV, pad=None, padmode=fastdes.PAD_PKCS5)
+    if last:
+        return IV + des.encrypt(data)
+    return IV + des.crypt(data, fastdes.ENCRYPT)
+
+def _decrypt_segment(args):
+    key, segment, last = args
+    des = fastdes.des(key, fastdes.CBC, segment[:8], pad=None, padmode=fastdes.PAD_PKCS5)
+    if last:
+        return des.decrypt(segment[8:])
+    return des.crypt(segment[8:], fastdes.DECRYPT)
+
+class SegmentedDES(object):
+    '''
+    Encrypt the data into segments, each one encrypted independently with it's own random IV,
+    so that the segments can be crypted on a process pool,
+    and a range of the content can be decrypted from the segments it lies in only.
+    
+    The format is:
+    header: magic 'S3DESSEG' (8 bytes) | segment size (4 bytes, big endian)
+    segments: IV (8 bytes) | DES CBC of segment size bytes of the content,
+    and the last segment holds the rest of the content (may be empty), padded with PKCS5,
+    so the n-th segment starts at header size + n * (8 + segment size).
+    
+    Unlike DES, the IVs are saved with the segments, the secret 8 bytes are used as the key.
+    '''
+
+    def __init__(self, key, segment_size=SEGMENT_SIZE, processes=None):
+        '''
+        :param key: the secret, length must be 8 bytes.
+        :param segment_size: bytes of content in each segment, a multiple of 8.
+        :param processes: size of the process pool, as default the count of cpus.
+        '''
+
+        assert isinstance(key, str)
+        assert len(key) == 8
+        assert segment_size > 0 and segment_size % 8 == 0
+
+        self.key = key
+        self.segment_size = segment_size
+        self.processes = processes or multiprocessing.cpu_count()
+        self._pool = None
+
+    def _map(self, func, tasks):
+        if self.processes == 1 or len(tasks) <= 1:
+            return map(func, tasks)
+        if self._pool is None:
+            self._pool = multiprocessing.Pool(self.processes)
+        return self._pool.map(func, tasks)
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.terminate()
+            self._pool = None
+
+    def encrypt_chunks(self, chunks):
+        '''
+        Encrypt the chunks from an iterator, and yield the header and the encrypted segments.
+        The segments are encrypted in batches, so that at most twice of the processes
+        of segments are kept in memory.
+        '''
+
+        yield struct.pack(SEGMENT_HEADER, SEGMENT_MAGIC, self.segment_size)
+
+        batch_size = self.processes * 2
+        buf = []
+        buf_size = 0
+        batch = []
+        for chunk in chunks:
+            buf.append(chunk)
+            buf_size += len(chunk)
+            if buf_size < self.segment_size:
+                continue
+
+            data = ''.join(buf)
+            count = len(data) // self.segment_size
+            for i in range(count):
+                segment = data[i*self.segment_size:(i+1)*self.segment_size]
+                batch.append((self.key, os.urandom(8), segment, False))
+            data = data[count*self.segment_size:]
+            buf, buf_size = [data], len(data)
+
+            if len(batch) >= batch_size:
+                for segment in self._map(_encrypt_segment, batch):
+                    yield segment
+                batch = []
+
+        batch.append((self.key, os.urandom(8), ''.join(buf), True))
+        for segment in self._map(_encrypt_segment, batch):
+            yield segment
+
+    def parse_header(self, header):
+        '''
+        Check the header, and return the segment size in it.
+        '''
+
+        if len(header) < SEGMENT_HEADER_SIZE:
+            raise ValueError("The data is too short to be segmented.")
+        magic, segment_size = struct.unpack(SEGMENT_HEADER, header[:SEGMENT_HEADER_SIZE])
+        if magic != SEGMENT_MAGIC:
+            raise ValueError("The data is not segmented by SegmentedDES.")
+        return segment_size
+
+    def decrypt_chunks(self, chunks):
+        '''
+        Decrypt the header and the segments from an iterator of chunks,
+        and yield the decrypted content, the segment size is read from the header.
+        '''
+
+        batch_size = self.processes * 2
+        data = ''
+        piece_size = None
+        batch = []
+        for chunk in chunks:
+            data += chunk
+            if piece_size is None:
+                if len(data) < SEGMENT_HEADER_SIZE:
+                    continue
+                piece_size = 8 + self.parse_header(data)
+                data = data[SEGMENT_HEADER_SIZE:]
+
+            # the last whole segment is held, as it may be the last one.
+            count = (len(data) - 1) // piece_size
+            for i in range(count):
+                batch.append((self.key, data[i*piece_size:(i+1)*piece_size], False))
+            data = data[count*piece_size:]
+
+            if len(batch) >= batch_size:
+                for decrypted in self._map(_decrypt_segment, batch):
+                    yield decrypted
+                batch = []
+
+        if piece_size is None:
+            self.parse_header(data)
+        if len(data) < 16:
+            raise ValueError("The last segment is incomplete.")
+        batch.append((self.key, data, True))
+        for decrypted in self._map(_decrypt_segment, batch):
+            yield decrypted
+
+    def get_segments_range(self, start, end, segment_size=None):
+        '''
+        Get the range of the segments which the content from start to end (both included) lies in.
+        
+        :return: (start, end) of the segments in the encrypted data, both included.
+        '''
+
+        segment_size = segment_size or self.segment_size
+        piece_size = 8 + segment_size
+        return (SEGMENT_HEADER_SIZE + start // segment_size * piece_size,
+                SEGMENT_HEADER_SIZE + (end // segment_size + 1) * piece_size - 1)
+
+    def decrypt_range(self, data, start, end, is_tail, segment_size=None):
+        '''
+        Decrypt the content from start to end (both included),
+        out of the segments got by the range of 'get_segments_range'.
+        
+        :param data: the segments.
+        :param is_tail: if the segments reach the end of the encrypted data.
+        '''
+
+        segment_size = segment_size or self.segment_size
+        piece_size = 8 + segment_size
+
+        tasks = []
+        for i in range(0, len(data), piece_size):
+            last = is_tail and i + piece_size >= len(data)
+            tasks.append((self.key, data[i:i+piece_size], last))
+
+        offset = start // segment_size * segment_size
+        return ''.join(self._map(_decrypt_segment, tasks))[start-offset:end-offset+1]
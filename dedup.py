@@ -0,0 +1,115 @@
+#!/usr/bin/env python
+#coding=utf-8
+'''
+Copyright (c) 2026 the s3_rest_py contributors
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+Created on 2026-10-16
+
+@author: s3_rest_py contributors
+'''
+
+import sqlite3
+import threading
+
+from errors import S3Error
+
+__author__ = "s3_rest_py contributors"
+__description__ = "index of the md5 of the objects uploaded, to skip uploading the same content again."
+
+class ContentIndex(object):
+    '''
+    Keep the md5 and the size of the content of each object uploaded, in sqlite.
+    The index can be shared by the threads, and by the processes with their own instances.
+
+    Usage:
+    index = ContentIndex('index.db')
+    if not index.is_uploaded('my_bucket', 'my_obj', md5_hex):
+        client.put_object('my_bucket', 'my_obj', content)
+        index.set('my_bucket', 'my_obj', md5_hex, len(content))
+    '''
+
+    def __init__(self, filename, timeout=30):
+        '''
+        :param timeout: seconds to wait when the other processes are writing the index.
+        '''
+
+        self.filename = filename
+        self._lock = threading.Lock()
+
+        self._conn = sqlite3.connect(filename, timeout=timeout, check_same_thread=False)
+        self._conn.text_factory = str
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('''create table if not exists content (
+                                  bucket text, key text,
+                                  md5 text, size integer,
+                                  primary key (bucket, key))''')
+        self._conn.commit()
+
+    def get(self, bucket_name, obj_name):
+        '''
+        :return: the (md5, size) of the object, None if not in the index.
+        '''
+
+        self._lock.acquire()
+        try:
+            row = self._conn.execute('select md5, size from content where bucket = ? and key = ?',
+                                     (bucket_name, obj_name)).fetchone()
+        finally:
+            self._lock.release()
+
+        return tuple(row) if row is not None else None
+
+    def set(self, bucket_name, obj_name, md5_hex, size):
+        self._lock.acquire()
+        try:
+            self._conn.execute('insert or replace into content values (?, ?, ?, ?)',
+                               (bucket_name, obj_name, md5_hex, size))
+            self._conn.commit()
+        finally:
+            self._lock.release()
+
+    def is_uploaded(self, bucket_name, obj_name, md5_hex, size=None, client=None):
+        '''
+        If the object with the same content has been uploaded.
+
+        :param size: if given, the size is checked too.
+        :param client: if given, when the object isn't in the index,
+                       it's etag is got from S3 to compare, and kept in the index if the same.
+                       The etag of the object uploaded by multipart isn't the md5, so never the same.
+        '''
+
+        got = self.get(bucket_name, obj_name)
+        if got is not None:
+            return got[0] == md5_hex and (size is None or got[1] == size)
+        if client is None:
+            return False
+
+        try:
+            obj = client.stat_object(bucket_name, obj_name)
+        except S3Error:
+            return False
+
+        if (getattr(obj, 'etag', None) or '').strip('"') != md5_hex or \
+            (size is not None and getattr(obj, 'size', None) != size):
+            return False
+        self.set(bucket_name, obj_name, md5_hex, size)
+        return True
+
+    def close(self):
+        self._lock.acquire()
+        try:
+            self._conn.close()
+        finally:
+            self._lock.release()
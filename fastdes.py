@@ -0,0 +1,384 @@
+#!/usr/bin/env python
+#coding=utf-8
+'''
+Copyright (c) 2026 the s3_rest_py contributors
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+Created on 2026-10-16
+
+@author: s3_rest_py contributors
+'''
+
+import struct
+
+from pyDes import _baseDes, ECB, CBC, PAD_NORMAL, PAD_PKCS5
+
+__author__ = "s3_rest_py contributors"
+__description__ = '''table driven DES and triple DES, the same interface and output as pyDes.
+The blocks are crypted as 32 bits integers, with the S-boxes and P permutation
+combined into SP tables, and the IP/FP permutations done by byte lookup tables.'''
+__all__ = ['des', 'triple_des', 'ECB', 'CBC', 'PAD_NORMAL', 'PAD_PKCS5']
+
+# The tables below are the same as pyDes, bits are counted from the most significant one.
+PC1 = [56, 48, 40, 32, 24, 16,  8,
+        0, 57, 49, 41, 33, 25, 17,
+        9,  1, 58, 50, 42, 34, 26,
+       18, 10,  2, 59, 51, 43, 35,
+       62, 54, 46, 38, 30, 22, 14,
+        6, 61, 53, 45, 37, 29, 21,
+       13,  5, 60, 52, 44, 36, 28,
+       20, 12,  4, 27, 19, 11,  3]
+
+LEFT_ROTATIONS = [1, 1, 2, 2, 2, 2, 2, 2, 1, 2, 2, 2, 2, 2, 2, 1]
+
+PC2 = [13, 16, 10, 23,  0,  4,
+        2, 27, 14,  5, 20,  9,
+       22, 18, 11,  3, 25,  7,
+       15,  6, 26, 19, 12,  1,
+       40, 51, 30, 36, 46, 54,
+       29, 39, 50, 44, 32, 47,
+       43, 48, 38, 55, 33, 52,
+       45, 41, 49, 35, 28, 31]
+
+IP = [57, 49, 41, 33, 25, 17, 9,  1,
+      59, 51, 43, 35, 27, 19, 11, 3,
+      61, 53, 45, 37, 29, 21, 13, 5,
+      63, 55, 47, 39, 31, 23, 15, 7,
+      56, 48, 40, 32, 24, 16, 8,  0,
+      58, 50, 42, 34, 26, 18, 10, 2,
+      60, 52, 44, 36, 28, 20, 12, 4,
+      62, 54, 46, 38, 30, 22, 14, 6]
+
+FP = [39,  7, 47, 15, 55, 23, 63, 31,
+      38,  6, 46, 14, 54, 22, 62, 30,
+      37,  5, 45, 13, 53, 21, 61, 29,
+      36,  4, 44, 12, 52, 20, 60, 28,
+      35,  3, 43, 11, 51, 19, 59, 27,
+      34,  2, 42, 10, 50, 18, 58, 26,
+      33,  1, 41,  9, 49, 17, 57, 25,
+      32,  0, 40,  8, 48, 16, 56, 24]
+
+SBOX = [
+    # S1
+    [14, 4, 13, 1, 2, 15, 11, 8, 3, 10, 6, 12, 5, 9, 0, 7,
+     0, 15, 7, 4, 14, 2, 13, 1, 10, 6, 12, 11, 9, 5, 3, 8,
+     4, 1, 14, 8, 13, 6, 2, 11, 15, 12, 9, 7, 3, 10, 5, 0,
+     15, 12, 8, 2, 4, 9, 1, 7, 5, 11, 3, 14, 10, 0, 6, 13],
+    # S2
+    [15, 1, 8, 14, 6, 11, 3, 4, 9, 7, 2, 13, 12, 0, 5, 10,
+     3, 13, 4, 7, 15, 2, 8, 14, 12, 0, 1, 10, 6, 9, 11, 5,
+     0, 14, 7, 11, 10, 4, 13, 1, 5, 8, 12, 6, 9, 3, 2, 15,
+     13, 8, 10, 1, 3, 15, 4, 2, 11, 6, 7, 12, 0, 5, 14, 9],
+    # S3
+    [10, 0, 9, 14, 6, 3, 15, 5, 1, 13, 12, 7, 11, 4, 2, 8,
+     13, 7, 0, 9, 3, 4, 6, 10, 2, 8, 5, 14, 12, 11, 15, 1,
+     13, 6, 4, 9, 8, 15, 3, 0, 11, 1, 2, 12, 5, 10, 14, 7,
+     1, 10, 13, 0, 6, 9, 8, 7, 4, 15, 14, 3, 11, 5, 2, 12],
+    # S4
+    [7, 13, 14, 3, 0, 6, 9, 10, 1, 2, 8, 5, 11, 12, 4, 15,
+     13, 8, 11, 5, 6, 15, 0, 3, 4, 7, 2, 12, 1, 10, 14, 9,
+     10, 6, 9, 0, 12, 11, 7, 13, 15, 1, 3, 14, 5, 2, 8, 4,
+     3, 15, 0, 6, 10, 1, 13, 8, 9, 4, 5, 11, 12, 7, 2, 14],
+    # S5
+    [2, 12, 4, 1, 7, 10, 11, 6, 8, 5, 3, 15, 13, 0, 14, 9,
+     14, 11, 2, 12, 4, 7, 13, 1, 5, 0, 15, 10, 3, 9, 8, 6,
+     4, 2, 1, 11, 10, 13, 7, 8, 15, 9, 12, 5, 6, 3, 0, 14,
+     11, 8, 12, 7, 1, 14, 2, 13, 6, 15, 0, 9, 10, 4, 5, 3],
+    # S6
+    [12, 1, 10, 15, 9, 2, 6, 8, 0, 13, 3, 4, 14, 7, 5, 11,
+     10, 15, 4, 2, 7, 12, 9, 5, 6, 1, 13, 14, 0, 11, 3, 8,
+     9, 14, 15, 5, 2, 8, 12, 3, 7, 0, 4, 10, 1, 13, 11, 6,
+     4, 3, 2, 12, 9, 5, 15, 10, 11, 14, 1, 7, 6, 0, 8, 13],
+    # S7
+    [4, 11, 2, 14, 15, 0, 8, 13, 3, 12, 9, 7, 5, 10, 6, 1,
+     13, 0, 11, 7, 4, 9, 1, 10, 14, 3, 5, 12, 2, 15, 8, 6,
+     1, 4, 11, 13, 12, 3, 7, 14, 10, 15, 6, 8, 0, 5, 9, 2,
+     6, 11, 13, 8, 1, 4, 10, 7, 9, 5, 0, 15, 14, 2, 3, 12],
+    # S8
+    [13, 2, 8, 4, 6, 15, 11, 1, 10, 9, 3, 14, 5, 0, 12, 7,
+     1, 15, 13, 8, 10, 3, 7, 4, 12, 5, 6, 11, 0, 14, 9, 2,
+     7, 11, 4, 1, 9, 12, 14, 2, 0, 6, 10, 13, 15, 3, 5, 8,
+     2, 1, 14, 7, 4, 10, 8, 13, 15, 12, 9, 0, 3, 5, 6, 11],
+]
+
+P = [15, 6, 19, 20, 28, 11,
+     27, 16, 0, 14, 22, 25,
+     4, 17, 30, 9, 1, 7,
+     23, 13, 31, 26, 2, 8,
+     18, 12, 29, 5, 21, 10,
+     3, 24]
+
+ENCRYPT = 0x00
+DECRYPT = 0x01
+
+def _permutate(value, table, bits):
+    '''
+    Permutate the value of bits length with the table.
+    '''
+
+    result = 0
+    for pos in table:
+        result = (result << 1) | ((value >> (bits - 1 - pos)) & 1)
+    return result
+
+def _create_sp_tables():
+    # SP[i][v] is the output of S-box i for the 6 bits v, permutated by P.
+    tables = []
+    for i, sbox in enumerate(SBOX):
+        table = []
+        for v in range(64):
+            row = ((v >> 4) & 2) | (v & 1)
+            col = (v >> 1) & 0xf
+            table.append(_permutate(sbox[row * 16 + col] << (28 - 4 * i), P, 32))
+        tables.append(table)
+    return tables
+
+def _create_byte_tables(table):
+    # For the byte i of the block, the tables give the left and right half of
+    # the permutation of the byte value, so the permutation is the OR of 8 lookups.
+    lefts, rights = [], []
+    for i in range(8):
+        left, right = [], []
+        for v in range(256):
+            permutated = _permutate(v << (56 - 8 * i), table, 64)
+            left.append(permutated >> 32)
+            right.append(permutated & 0xffffffff)
+        lefts.append(left)
+        rights.append(right)
+    return lefts, rights
+
+SP1, SP2, SP3, SP4, SP5, SP6, SP7, SP8 = _create_sp_tables()
+(IPL1, IPL2, IPL3, IPL4, IPL5, IPL6, IPL7, IPL8), \
+(IPR1, IPR2, IPR3, IPR4, IPR5, IPR6, IPR7, IPR8) = _create_byte_tables(IP)
+(FPL1, FPL2, FPL3, FPL4, FPL5, FPL6, FPL7, FPL8), \
+(FPR1, FPR2, FPR3, FPR4, FPR5, FPR6, FPR7, FPR8) = _create_byte_tables(FP)
+
+def _create_sub_keys(key):
+    '''
+    Create the 16 subkeys from the 8 bytes key.
+    Each subkey is split into 8 pieces of 6 bits, one for each S-box,
+    placed where they are xor-ed with the 34 bits expansion in _crypt_block,
+    the pieces for the odd S-boxes and for the even ones don't overlap,
+    so they are kept as 2 integers.
+    '''
+
+    key = _permutate(struct.unpack('>Q', key)[0], PC1, 64)
+    c, d = key >> 28, key & 0xfffffff
+
+    sub_keys = []
+    for rotation in LEFT_ROTATIONS:
+        c = ((c << rotation) | (c >> (28 - rotation))) & 0xfffffff
+        d = ((d << rotation) | (d >> (28 - rotation))) & 0xfffffff
+        k = _permutate((c << 28) | d, PC2, 56)
+        pieces = [((k >> (42 - 6 * i)) & 0x3f) << (28 - 4 * i) for i in range(8)]
+        sub_keys.append((sum(pieces[0::2]), sum(pieces[1::2])))
+    return sub_keys
+
+def _crypt_block(a, b, stages,
+                 SP1=SP1, SP2=SP2, SP3=SP3, SP4=SP4, SP5=SP5, SP6=SP6, SP7=SP7, SP8=SP8):
+    '''
+    Crypt the block of 2 halves of 32 bits, through the stages of 16 subkeys each.
+    The final and initial permutation between the stages cancel each other out,
+    so they are done only once.
+    The SP tables are bound as default arguments, which are faster to look up than globals.
+    '''
+
+    l = IPL1[a >> 24] | IPL2[(a >> 16) & 0xff] | IPL3[(a >> 8) & 0xff] | IPL4[a & 0xff] | \
+        IPL5[b >> 24] | IPL6[(b >> 16) & 0xff] | IPL7[(b >> 8) & 0xff] | IPL8[b & 0xff]
+    r = IPR1[a >> 24] | IPR2[(a >> 16) & 0xff] | IPR3[(a >> 8) & 0xff] | IPR4[a & 0xff] | \
+        IPR5[b >> 24] | IPR6[(b >> 16) & 0xff] | IPR7[(b >> 8) & 0xff] | IPR8[b & 0xff]
+
+    for sub_keys in stages:
+        for odd, even in sub_keys:
+            # r with it's last bit before and first bit after, 34 bits,
+            # the 6 bits pieces of the expansion are 4 bits apart.
+            e = ((r & 1) << 33) | (r << 1) | (r >> 31)
+            u = e ^ odd
+            v = e ^ even
+            l ^= SP1[u >> 28] | SP2[(v >> 24) & 0x3f] | \
+                 SP3[(u >> 20) & 0x3f] | SP4[(v >> 16) & 0x3f] | \
+                 SP5[(u >> 12) & 0x3f] | SP6[(v >> 8) & 0x3f] | \
+                 SP7[(u >> 4) & 0x3f] | SP8[v & 0x3f]
+            l, r = r, l
+        # R16 L16 goes to the next stage, or the final permutation.
+        l, r = r, l
+
+    a = FPL1[l >> 24] | FPL2[(l >> 16) & 0xff] | FPL3[(l >> 8) & 0xff] | FPL4[l & 0xff] | \
+        FPL5[r >> 24] | FPL6[(r >> 16) & 0xff] | FPL7[(r >> 8) & 0xff] | FPL8[r & 0xff]
+    b = FPR1[l >> 24] | FPR2[(l >> 16) & 0xff] | FPR3[(l >> 8) & 0xff] | FPR4[l & 0xff] | \
+        FPR5[r >> 24] | FPR6[(r >> 16) & 0xff] | FPR7[(r >> 8) & 0xff] | FPR8[r & 0xff]
+    return a, b
+
+class _tableDes(_baseDes):
+    '''
+    The base class shared by des and triple des,
+    the subclass sets the encrypt and decrypt stages of subkeys in setKey.
+    '''
+
+    def crypt(self, data, crypt_type):
+        '''
+        Crypt the data in blocks, the data must be a multiple of 8 bytes,
+        unless the padding character is set.
+        '''
+
+        if not data:
+            return ''
+        if len(data) % self.block_size != 0:
+            if crypt_type == DECRYPT: # Decryption must work on 8 byte blocks
+                raise ValueError("Invalid data length, data must be a multiple of " + str(self.block_size) + " bytes\n.")
+            if not self.getPadding():
+                raise ValueError("Invalid data length, data must be a multiple of " + str(self.block_size) + " bytes\n. Try setting the optional padding character")
+            data += (self.block_size - (len(data) % self.block_size)) * self.getPadding()
+
+        if crypt_type == ENCRYPT:
+            stages = self._encrypt_stages
+        else:
+            stages = self._decrypt_stages
+
+        fmt = '>%dI' % (len(data) // 4)
+        halves = struct.unpack(fmt, data)
+        result = [0] * len(halves)
+
+        if self.getMode() == CBC:
+            if not self.getIV():
+                raise ValueError("For CBC mode, you must supply the Initial Value (IV) for ciphering")
+            iv_a, iv_b = struct.unpack('>2I', self.getIV())
+
+            if crypt_type == ENCRYPT:
+                for i in xrange(0, len(halves), 2):
+                    iv_a, iv_b = _crypt_block(halves[i] ^ iv_a, halves[i + 1] ^ iv_b, stages)
+                    result[i], result[i + 1] = iv_a, iv_b
+            else:
+                for i in xrange(0, len(halves), 2):
+                    a, b = _crypt_block(halves[i], halves[i + 1], stages)
+                    result[i], result[i + 1] = a ^ iv_a, b ^ iv_b
+                    iv_a, iv_b = halves[i], halves[i + 1]
+        else:
+            for i in xrange(0, len(halves), 2):
+                result[i], result[i + 1] = _crypt_block(halves[i], halves[i + 1], stages)
+
+        return struct.pack(fmt, *result)
+
+    def encrypt(self, data, pad=None, padmode=None):
+        '''
+        The same as pyDes, data is padded as the pad or padmode, then encrypted.
+        '''
+
+        data = self._guardAgainstUnicode(data)
+        if pad is not None:
+            pad = self._guardAgainstUnicode(pad)
+        data = self._padData(data, pad, padmode)
+        return self.crypt(data, ENCRYPT)
+
+    def decrypt(self, data, pad=None, padmode=None):
+        '''
+        The same as pyDes, data is decrypted, then the padding removed as the pad or padmode.
+        '''
+
+        data = self._guardAgainstUnicode(data)
+        if pad is not None:
+            pad = self._guardAgainstUnicode(pad)
+        data = self.crypt(data, DECRYPT)
+        return self._unpadData(data, pad, padmode)
+
+class des(_tableDes):
+    '''
+    DES encryption/decryption class, supports ECB and CBC modes.
+
+    des(key, [mode], [IV], [pad], [padmode]), the same as pyDes.des.
+    '''
+
+    def __init__(self, key, mode=ECB, IV=None, pad=None, padmode=PAD_NORMAL):
+        if len(key) != 8:
+            raise ValueError("Invalid DES key size. Key must be exactly 8 bytes long.")
+        _baseDes.__init__(self, mode, IV, pad, padmode)
+        self.key_size = 8
+
+        self.setKey(key)
+
+    def setKey(self, key):
+        '''Will set the crypting key for this object. Must be 8 bytes.'''
+
+        _baseDes.setKey(self, key)
+        sub_keys = _create_sub_keys(self.getKey())
+        self._encrypt_stages = (sub_keys, )
+        self._decrypt_stages = (sub_keys[::-1], )
+
+class triple_des(_tableDes):
+    '''
+    Triple DES encryption/decryption class, DES-EDE3 with a 24 bytes key,
+    or DES-EDE2 with a 16 bytes key, supports ECB and CBC modes.
+
+    triple_des(key, [mode], [IV], [pad], [padmode]), the same as pyDes.triple_des.
+    '''
+
+    def __init__(self, key, mode=ECB, IV=None, pad=None, padmode=PAD_NORMAL):
+        _baseDes.__init__(self, mode, IV, pad, padmode)
+        self.setKey(key)
+
+    def setKey(self, key):
+        '''Will set the crypting key for this object. Either 16 or 24 bytes long.'''
+
+        self.key_size = 24
+        if len(key) != self.key_size:
+            if len(key) == 16:
+                self.key_size = 16
+            else:
+                raise ValueError("Invalid triple DES key size. Key must be either 16 or 24 bytes long")
+        if self.getMode() == CBC:
+            if not self.getIV():
+                # Use the first 8 bytes of the key
+                self._iv = key[:self.block_size]
+            if len(self.getIV()) != self.block_size:
+                raise ValueError("Invalid IV, must be 8 bytes in length")
+        _baseDes.setKey(self, key)
+
+        key = self.getKey()
+        keys1 = _create_sub_keys(key[:8])
+        keys2 = _create_sub_keys(key[8:16])
+        keys3 = keys1 if self.key_size == 16 else _create_sub_keys(key[16:])
+        self._encrypt_stages = (keys1, keys2[::-1], keys3)
+        self._decrypt_stages = (keys3[::-1], keys2, keys1[::-1])
+
+def benchmark(size=64*1024):
+    '''
+    Compare the throughput with pyDes, and check the outputs are the same.
+    '''
+
+    import os
+    import time
+    import pyDes
+
+    data = os.urandom(size)
+    for name, classes, key in (('des', (pyDes.des, des), "DESCRYPT"),
+                               ('triple_des', (pyDes.triple_des, triple_des), "0123456789abcdefFEDCBA98")):
+        results = []
+        for cls in classes:
+            k = cls(key, CBC, "12345678", pad=None, padmode=PAD_PKCS5)
+
+            start = time.time()
+            encrypted = k.encrypt(data)
+            decrypted = k.decrypt(encrypted)
+            elapsed = time.time() - start
+
+            assert decrypted == data
+            results.append((encrypted, elapsed))
+
+        assert results[0][0] == results[1][0], 'the output differs from pyDes'
+        print '%s: pyDes %.1f KB/s, fastdes %.1f KB/s, %.1fx' % (
+            name, size * 2 / 1024.0 / results[0][1], size * 2 / 1024.0 / results[1][1],
+            results[0][1] / results[1][1])
+
+if __name__ == '__main__':
+    benchmark()
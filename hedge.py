@@ -0,0 +1,213 @@
+#!/usr/bin/env python
+#coding=utf-8
+'''
+Copyright (c) 2026 the s3_rest_py contributors
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+Created on 2026-10-16
+
+@author: s3_rest_py contributors
+'''
+
+import collections
+import Queue
+import sys
+import threading
+import time
+
+__author__ = "s3_rest_py contributors"
+__description__ = "hedged requests, a duplicate is sent when the first is slower than usual."
+
+class HedgeSkipped(Exception):
+    '''
+    Raised by the func of a hedge which can't be sent, such as no connection is free,
+    the hedge is given up without an error, and it's budget is given back.
+    '''
+
+class HedgePolicy(object):
+    '''
+    Decide when a request is hedged, and run the hedged requests.
+
+    A request not answered within the delay is sent once more,
+    the one answered first is taken, and the other is cancelled when it's answered.
+    The delay is the percentile of the latencies of the recent requests,
+    so only the requests slower than most of the others are hedged.
+
+    The hedges are limited by a budget, each request earns `budget` of a hedge,
+    and up to `max_burst` hedges can be saved,
+    so the extra requests are no more than about `budget` of all.
+    '''
+
+    def __init__(self, percentile=95, delay=0.1, min_delay=0.01, max_delay=2,
+                 window=1000, min_samples=20, budget=0.05, max_burst=10):
+        '''
+        :param percentile: the percentile of the latencies used as the delay.
+        :param delay: the delay used before min_samples latencies recorded.
+        :param min_delay: the lower limit of the delay, in seconds.
+        :param max_delay: the upper limit of the delay, in seconds.
+        :param window: count of the recent latencies kept.
+        :param budget: the hedges earned by each request, 0.05 means at most about 5% requests hedged.
+        :param max_burst: max hedges can be saved.
+        '''
+
+        self.percentile = percentile
+        self.delay = delay
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.min_samples = min_samples
+        self.budget = budget
+        self.max_burst = max_burst
+
+        self._lock = threading.Lock()
+        self._latencies = collections.deque(maxlen=window)
+        self._tokens = max_burst
+
+    def record(self, latency):
+        self._lock.acquire()
+        try:
+            self._latencies.append(latency)
+        finally:
+            self._lock.release()
+
+    def get_delay(self):
+        '''
+        :return: the seconds to wait before a request is hedged.
+        '''
+
+        self._lock.acquire()
+        try:
+            if len(self._latencies) < self.min_samples:
+                return self.delay
+            latencies = sorted(self._latencies)
+        finally:
+            self._lock.release()
+
+        index = min(len(latencies) - 1, int(len(latencies) * self.percentile / 100.0))
+        return min(self.max_delay, max(self.min_delay, latencies[index]))
+
+    def _earn(self):
+        self._lock.acquire()
+        try:
+            self._tokens = min(self.max_burst, self._tokens + self.budget)
+        finally:
+            self._lock.release()
+
+    def _refund(self):
+        self._lock.acquire()
+        try:
+            self._tokens = min(self.max_burst, self._tokens + 1)
+        finally:
+            self._lock.release()
+
+    def _spend(self):
+        self._lock.acquire()
+        try:
+            if self._tokens < 1:
+                return False
+            self._tokens -= 1
+            return True
+        finally:
+            self._lock.release()
+
+    def call(self, func, cancel=None):
+        '''
+        Call the func, and call it again in another thread if it doesn't return within the delay,
+        the result returned first is returned.
+        If the first call fails before hedged, the error is raised at once,
+        else the error is raised only when both failed.
+
+        :param func: called without arguments, it should return when the first byte is answered,
+                     such as an S3Request submitted with stream.
+                     The second call may raise HedgeSkipped to give up the hedge.
+        :param cancel: called with the result of the slower call, to close it.
+        '''
+
+        self._earn()
+
+        results = Queue.Queue()
+        settled = threading.Event()
+        lock = threading.Lock()
+        running = [1]
+
+        def _attempt(hedged=False):
+            start = time.time()
+            try:
+                result = func()
+            except HedgeSkipped:
+                if not hedged:
+                    results.put((False, sys.exc_info()))
+                    return
+                # neither answered nor failed
+                self._refund()
+                results.put((None, None))
+                return
+            except Exception:
+                results.put((False, sys.exc_info()))
+                return
+            self.record(time.time() - start)
+
+            lock.acquire()
+            try:
+                late = settled.is_set()
+                if not late:
+                    results.put((True, result))
+            finally:
+                lock.release()
+            if late and cancel is not None:
+                cancel(result)
+
+        def _hedge(delay):
+            settled.wait(delay)
+            lock.acquire()
+            try:
+                if settled.is_set() or not self._spend():
+                    return
+                running[0] += 1
+            finally:
+                lock.release()
+            _attempt(hedged=True)
+
+        for target, args in ((_attempt, ()), (_hedge, (self.get_delay(), ))):
+            thread = threading.Thread(target=target, args=args)
+            thread.daemon = True
+            thread.start()
+
+        exc_info = None
+        while True:
+            ok, value = results.get()
+            lock.acquire()
+            try:
+                running[0] -= 1
+                if ok or running[0] == 0:
+                    settled.set()
+            finally:
+                lock.release()
+
+            if ok:
+                break
+            if ok is False:
+                exc_info = exc_info or value
+            if settled.is_set():
+                raise exc_info[0], exc_info[1], exc_info[2]
+
+        # a slower call answered before settled is left in the queue
+        while True:
+            try:
+                ok, other = results.get_nowait()
+            except Queue.Empty:
+                break
+            if ok and cancel is not None:
+                cancel(other)
+
+        return value
@@ -8,67 +8,492 @@
  * Version: 1.0
 '''
 
+import ConfigParser
 import cx_Oracle
 import os
+import sys
+import traceback
 import datetime
+from hashlib import md5
+import multiprocessing
 import time
+import threading
 import s3
+from checkpoint import CheckpointStore, Watermark
+from dedup import ContentIndex
+from pipeline import Pipeline
 
+WORKERS = 8                      # the threads uploading to S3 at the same time
+QUEUE_ITEMS = 100                # max rows fetched but not uploaded
+QUEUE_BYTES = 64 * 1024 * 1024   # max bytes of LOBs fetched but not uploaded
+ARRAYSIZE = 100                  # rows fetched from Oracle in one round trip
+INLINE_SIZE = 1024 * 1024        # the LOBs not larger are fetched with the rows as bytes
+BACKFILL_RANGES = 64             # the ranges of ids a table is split into to backfill
+BACKFILL_PROCESSES = 4           # the processes loading the ranges at the same time
+LOB_READ_SIZE = 1024 * 1024      # bytes read from a LOB at a time to hash it
+MAX_FAILURES = 5                 # the times a row fails before it's given up as dead
 
-def upload_ZPFJ_PTRYZPXXB(cur, begin_time, end_time):
-    sql = "select ID,ZP from ZPFJ_PTRYZPXXB where XT_ZHXGSJ > '%s' and XT_ZHXGSJ <= '%s'" % (begin_time, end_time)
 
-    # print sql
+class LOBFile(object):
+    '''
+    A seekable read only file-like object on a cx_Oracle LOB,
+    the content is read from Oracle when needed, instead of all at once.
+    '''
+
+    def __init__(self, lob):
+        self.lob = lob
+        self.size = lob.size()
+        self.pos = 0
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            size = self.size - self.pos
+        size = min(size, self.size - self.pos)
+        if size <= 0:
+            return ''
+
+        # the offset of LOB starts from 1
+        data = self.lob.read(self.pos + 1, size)
+        self.pos += len(data)
+        return data
+
+    def seek(self, offset, whence=0):
+        if whence == 1:
+            offset += self.pos
+        elif whence == 2:
+            offset += self.size
+        self.pos = max(0, offset)
+
+    def tell(self):
+        return self.pos
+
+
+def lob_md5(lob):
+    '''
+    :return: the md5 in hex and the size of the LOB, or the content already read.
+    '''
+
+    if isinstance(lob, basestring):
+        return md5(lob).hexdigest(), len(lob)
+
+    fp = LOBFile(lob)
+    hash_ = md5()
+    while True:
+        chunk = fp.read(LOB_READ_SIZE)
+        if not chunk:
+            break
+        hash_.update(chunk)
+    return hash_.hexdigest(), fp.size
+
+
+def upload_lob(client, lob, bucket_name, obj_name, x_amz_acl=s3.X_AMZ_ACL.private,
+               part_size=s3.PART_SIZE, concurrency=4):
+    '''
+    Upload the content of a LOB to S3 directly, without writing a local file.
+    A LOB not larger than part_size is read at once,
+    a larger one is uploaded by multipart, only the uploading parts are in memory.
+    The lob can also be the content already read.
+    '''
+
+    amz_headers = {}
+    if x_amz_acl != s3.X_AMZ_ACL.private:
+        amz_headers['acl'] = x_amz_acl
+
+    if isinstance(lob, basestring):
+        client.put_object(bucket_name, obj_name, lob, amz_headers=amz_headers)
+        return
+
+    fp = LOBFile(lob)
+    if fp.size > part_size:
+        client.put_object_multipart(bucket_name, obj_name, fp, size=fp.size, part_size=part_size,
+                                    concurrency=concurrency, amz_headers=amz_headers)
+    else:
+        client.put_object(bucket_name, obj_name, fp.read(), amz_headers=amz_headers)
+
+
+def _to_bool(value):
+    if isinstance(value, basestring):
+        return value.lower() in ('1', 'yes', 'true', 'on')
+    return bool(value)
+
+
+class TableMapping(object):
+    '''
+    Which LOB column of a table is loaded into which bucket,
+    and the workers and the queue of the pipeline loading it.
+    '''
+
+    def __init__(self, name, table, lob_column, bucket, id_column='ID', time_column='XT_ZHXGSJ',
+                 key_template='%(id)s', acl=s3.X_AMZ_ACL.public_read, workers=WORKERS,
+                 queue_items=QUEUE_ITEMS, queue_bytes=QUEUE_BYTES, arraysize=ARRAYSIZE,
+                 prefetchrows=None, inline_size=INLINE_SIZE, backfill_ranges=BACKFILL_RANGES,
+                 dedup=True, dedup_remote=False, max_failures=MAX_FAILURES):
+        self.name = name
+        self.table = table
+        self.lob_column = lob_column
+        self.bucket = bucket
+        self.id_column = id_column
+        self.time_column = time_column
+        self.key_template = key_template
+        self.acl = acl
+        self.workers = int(workers)
+        self.queue_items = int(queue_items)
+        self.queue_bytes = int(queue_bytes)
+        self.arraysize = int(arraysize)
+        self.prefetchrows = None if prefetchrows is None else int(prefetchrows)
+        self.inline_size = int(inline_size)
+        self.backfill_ranges = int(backfill_ranges)
+        self.dedup = _to_bool(dedup)
+        self.dedup_remote = _to_bool(dedup_remote)
+        # 0 never gives up a row
+        self.max_failures = int(max_failures) or None
+
+    def get_key(self, lob_id):
+        return self.key_template % {'id': lob_id, 'table': self.table}
+
 
-    cur.execute(sql.decode('utf8'))
+def load_mappings(filename):
+    '''
+    Read the table mappings from the config file, each section is a mapping, such as:
+
+    [photo]
+    table = ZPFJ_PTRYZPXXB
+    lob_column = ZP
+    bucket = ptryzp
+    key_template = photo/%(id)s
+    workers = 4
+
+    table, lob_column and bucket are required, the others are as the defaults of TableMapping.
+    The options in [DEFAULT] apply to all the mappings.
+    '''
+
+    parser = ConfigParser.RawConfigParser()
+    fp = open(filename)
+    try:
+        parser.readfp(fp)
+    finally:
+        fp.close()
+
+    mappings = []
+    for section in parser.sections():
+        kwargs = dict(parser.items(section))
+        mappings.append(TableMapping(section, **kwargs))
+    return mappings
+
+
+def inline_lob_handler(cursor, name, default_type, size, precision, scale):
+    '''
+    The output type handler fetches the LOBs as bytes with the rows,
+    instead of the locators read by a round trip each.
+    '''
+
+    if default_type == cx_Oracle.BLOB:
+        return cursor.var(cx_Oracle.LONG_BINARY, arraysize=cursor.arraysize)
+    if default_type == cx_Oracle.CLOB:
+        return cursor.var(cx_Oracle.LONG_STRING, arraysize=cursor.arraysize)
+
+
+def iter_lobs(cur, mapping, watermark=None):
+    '''
+    Yield ((id, content, seq, (time, id)), size) of the rows fetched by the cursor, for the pipeline.
+    The rows are (id, content, length, time), the content is None if the LOB is larger than
+    the inline size, the worker fetches it by id to stream.
+    seq is None without the watermark.
+    '''
 
     for rows in cur:
-        pic_id = rows[0]
-        pic_content = rows[1]
+        lob_id = rows[0]
+        content = rows[1]
+        length = rows[2]
+        seq = watermark.add() if watermark is not None else None
+        row_mark = (rows[3], lob_id)
+
+        if length is None:
+            print "%s file content is error by id : %s" % (mapping.table, lob_id)
+            if watermark is not None:
+                watermark.finish(seq, row_mark)
+            continue
 
-        local_filename = 'img/%s' % pic_id
-        obj_filename = '%s' % pic_id
-        print "uploading %s " % local_filename
-        file = open(local_filename, "wb")
-        file.write(pic_content.read())
-        file.close()
-        client.upload_file(local_filename, 'ptryzp', obj_filename, s3.X_AMZ_ACL.public_read)
-        # os.remove(local_filename)
-        print "upload finished .. "
+        if content is None:
+            yield (lob_id, None, seq, row_mark), 0
+        else:
+            yield (lob_id, content, seq, row_mark), len(content)
 
 
-def upload_ZPFJ_FJXXB(cur, begin_time, end_time):
-    sql = "select ID,WJ from ZPFJ_FJXXB where XT_ZHXGSJ > '%s' and XT_ZHXGSJ <= '%s'" % (begin_time, end_time)
+def execute_lobs(cur, mapping, where, params, order=True):
+    '''
+    Select (id, content, length, time) of the rows matched by where, for iter_lobs,
+    the content of the LOB not larger than the inline size is fetched with the row.
+    The values are bound by params, so the statement is parsed once and then reused by Oracle.
+    '''
+
+    params = dict(params, inline_size=mapping.inline_size)
+    sql = "select %(id)s," \
+          "case when dbms_lob.getlength(%(lob)s) <= :inline_size then %(lob)s end," \
+          "dbms_lob.getlength(%(lob)s),%(time)s " \
+          "from %(table)s where %(where)s" % \
+          {'id': mapping.id_column, 'lob': mapping.lob_column, 'time': mapping.time_column,
+           'table': mapping.table, 'where': where}
+    if order:
+        sql += " order by %s,%s" % (mapping.time_column, mapping.id_column)
 
     # print sql
 
-    cur.execute(sql.decode('utf8'))
+    cur.arraysize = mapping.arraysize
+    if mapping.prefetchrows is not None and hasattr(cur, 'prefetchrows'):
+        cur.prefetchrows = mapping.prefetchrows
+    cur.outputtypehandler = inline_lob_handler
+    cur.execute(sql.decode('utf8'), params)
 
-    for rows in cur:
 
-        file_id = rows[0]
-        file_content = rows[1]
+def upload_rows(client, cur, mapping, watermark=None, index=None):
+    '''
+    Upload the LOBs of the rows executed by execute_lobs,
+    the rows are fetched by the cursor while the former ones uploaded by the workers.
+    With the content index, the LOB whose content is the same as uploaded is skipped,
+    the large LOB is read to hash before uploaded.
+    '''
+
+    lob_sql = "select %s from %s where %s = :1" % (mapping.lob_column, mapping.table, mapping.id_column)
+    local = threading.local()
+
+    def upload(item):
+        lob_id, content, seq, row_mark = item
+        obj_filename = mapping.get_key(lob_id)
+
+        if content is None:
+            if not hasattr(local, 'cur'):
+                local.cur = cur.connection.cursor()
+            local.cur.execute(lob_sql.decode('utf8'), (lob_id, ))
+            content = local.cur.fetchone()[0]
+
+        dedup = index is not None and mapping.dedup
+        if dedup:
+            md5_hex, size = lob_md5(content)
+            if index.is_uploaded(mapping.bucket, obj_filename, md5_hex, size,
+                                 client if mapping.dedup_remote else None):
+                print "unchanged %s " % obj_filename
+                if watermark is not None:
+                    watermark.finish(seq, row_mark, lob_id)
+                return
+
+        print "uploading %s " % obj_filename
+        upload_lob(client, content, mapping.bucket, obj_filename, mapping.acl)
+        if dedup:
+            index.set(mapping.bucket, obj_filename, md5_hex, size)
+        if watermark is not None:
+            watermark.finish(seq, row_mark, lob_id)
+        print "upload finished %s .. " % obj_filename
+
+    def on_error(item, exc_info):
+        lob_id, _, seq, row_mark = item
+        print "%s upload failed by id : %s, %s" % (mapping.table, lob_id, exc_info[1])
+        if watermark is not None and \
+            watermark.fail(seq, row_mark, lob_id, str(exc_info[1])[:1000]):
+            print "%s gave up by id : %s after %d failures, kept in the dead rows" % (
+                mapping.table, lob_id, mapping.max_failures)
+
+    pipeline = Pipeline(upload, workers=mapping.workers, max_items=mapping.queue_items,
+                        max_bytes=mapping.queue_bytes, on_error=on_error)
+    return pipeline.run(iter_lobs(cur, mapping, watermark))
 
-        if file_content is None:
-            print "ZPFJ_FJXXB file content is error by id : %s" % file_id
-            continue
 
-        local_filename = 'img/%s' % file_id
-        obj_filename = '%s' % file_id
-        print "uploading %s " % local_filename
+def upload_lobs(client, cur, store, mapping, begin_time, end_time, index=None):
+    '''
+    Upload the LOBs of the mapping changed after the watermark in the store, until end_time.
+    The watermark is (time, id) of the last row uploaded, with all the rows before it,
+    in the order of time and id, so the rows are neither missed nor uploaded again.
+    If no watermark stored, the rows changed after begin_time are uploaded.
+    A row failed max_failures times is given up, so it doesn't hold the watermark forever.
+    '''
 
-        file = open(local_filename, "wb")
-        file.write(file_content.read())
-        file.close()
-        client.upload_file(local_filename, 'fjxxb', obj_filename, s3.X_AMZ_ACL.public_read)
-        # os.remove(local_filename)
-        print "upload finished .. "
+    mark = store.get(mapping.name) or (begin_time, None)
+    watermark = Watermark(store, mapping.name, mark, mapping.max_failures)
+
+    params = {'begin_time': mark[0], 'end_time': end_time}
+    if mark[1] is None:
+        where = "%(time)s > :begin_time"
+    else:
+        where = "(%(time)s > :begin_time or %(time)s = :begin_time and %(id)s > :begin_id)"
+        params['begin_id'] = mark[1]
+    where = (where + " and %(time)s <= :end_time") % \
+            {'time': mapping.time_column, 'id': mapping.id_column}
+
+    execute_lobs(cur, mapping, where, params)
+    succeeded, failed = upload_rows(client, cur, mapping, watermark, index)
+    if succeeded or failed:
+        print "%s: %d uploaded, %d failed" % (mapping.name, succeeded, len(failed))
+    return succeeded, failed
+
+
+def split_ranges(cur, mapping, count):
+    '''
+    Split the ids of the table into count ranges of about the same rows.
+
+    :return: the list of (low, high), both included.
+    '''
+
+    sql = "select min(%(id)s),max(%(id)s) from " \
+          "(select %(id)s,ntile(:count) over (order by %(id)s) part from %(table)s) " \
+          "group by part order by part" % {'id': mapping.id_column, 'table': mapping.table}
+    cur.execute(sql.decode('utf8'), {'count': count})
+    return [tuple(row) for row in cur.fetchall()]
+
+
+_backfill = {}  # the client and the cursor of a backfill process
+
+
+def _init_backfill(oracle, s3_args, index_file):
+    access_key, secret_access_key, end_point = s3_args
+    s3.end_point = end_point
+    _backfill['client'] = s3.S3Client(access_key, secret_access_key)
+    _backfill['cur'] = cx_Oracle.connect(*oracle, threaded=True).cursor()
+    _backfill['index'] = ContentIndex(index_file) if index_file else None
+
+
+def _backfill_range(args):
+    mapping, range_no, low, high = args
+    where = "%(id)s >= :low and %(id)s <= :high" % {'id': mapping.id_column}
+
+    try:
+        cur = _backfill['cur']
+        execute_lobs(cur, mapping, where, {'low': low, 'high': high}, order=False)
+        succeeded, failed = upload_rows(_backfill['client'], cur, mapping, index=_backfill['index'])
+        return range_no, succeeded, len(failed)
+    except Exception:
+        print "%s backfill range %d failed:" % (mapping.name, range_no)
+        traceback.print_exc()
+        return range_no, 0, None
+
+
+def backfill(store, mapping, oracle, s3_args, processes=BACKFILL_PROCESSES, index_file=None):
+    '''
+    Upload all the rows of the mapping, the table is split into ranges of ids,
+    which are loaded by a pool of processes, each with it's own Oracle connection and S3Client.
+
+    The ranges and whether each is done are kept in the store,
+    so an interrupted backfill resumes with the ranges not done.
+    When the backfill starts, the watermark is set to the time if not set,
+    so the incremental loading goes on with the rows changed since then.
+
+    :param oracle: (user, password, dsn) to connect Oracle.
+    :param s3_args: (access_key, secret_access_key, end_point) of S3.
+    :param index_file: the file of the content index, opened by each process.
+    '''
+
+    ranges = store.get_ranges(mapping.name)
+    if not ranges:
+        orcl = cx_Oracle.connect(*oracle)
+        try:
+            if store.get(mapping.name) is None:
+                store.set(mapping.name, (datetime.datetime.now().strftime('%Y_%m_%d %H:%M:%S'), None))
+            store.set_ranges(mapping.name, split_ranges(orcl.cursor(), mapping, mapping.backfill_ranges))
+        finally:
+            orcl.close()
+        ranges = store.get_ranges(mapping.name)
+
+    tasks = [(mapping, range_no, low, high) for range_no, low, high, done in ranges if not done]
+    print "%s: backfill %d of %d ranges" % (mapping.name, len(tasks), len(ranges))
+    if not tasks:
+        return
+
+    pool = multiprocessing.Pool(processes, _init_backfill, (oracle, s3_args, index_file))
+    try:
+        for range_no, succeeded, failed in pool.imap_unordered(_backfill_range, tasks):
+            if failed == 0:
+                store.finish_range(mapping.name, range_no)
+                print "%s: range %d done, %d uploaded" % (mapping.name, range_no, succeeded)
+            else:
+                print "%s: range %d not done, %d uploaded, %s failed" % \
+                      (mapping.name, range_no, succeeded, failed)
+        pool.close()
+    finally:
+        pool.terminate()
+
+
+def load_table(client, connect, store, mapping, interval=3, index=None):
+    '''
+    Load the mapping every interval seconds forever, by it's own Oracle connection,
+    so that the mappings don't wait for each other.
+    The rows changed in the last 2 minutes are left to the next time,
+    for the transactions may not be committed yet.
+    After an Oracle error, such as the connection dropped, it connects again next time,
+    and the error of connecting is raised.
+    '''
+
+    orcl = cur = None
+
+    begin_time = datetime.datetime.now() + datetime.timedelta(minutes=-5)
+    while 1:
+        end_time = datetime.datetime.now() + datetime.timedelta(minutes=-2)
+
+        if orcl is None:
+            orcl = connect()
+            cur = orcl.cursor()
+
+        try:
+            upload_lobs(client, cur, store, mapping, begin_time.strftime('%Y_%m_%d %H:%M:%S'),
+                        end_time.strftime('%Y_%m_%d %H:%M:%S'), index)
+        except (cx_Oracle.DatabaseError, cx_Oracle.InterfaceError):
+            print "%s load failed, reconnecting:" % mapping.name
+            traceback.print_exc()
+            for closable in (cur, orcl):
+                try:
+                    closable.close()
+                except cx_Oracle.Error:
+                    pass
+            orcl = cur = None
+        except Exception:
+            print "%s load failed:" % mapping.name
+            traceback.print_exc()
+
+        time.sleep(interval)
+
+
+def run(client, connect, store, mappings, interval=3, index=None):
+    '''
+    Load each mapping in it's own thread, until interrupted,
+    or any of them stopped by an error, then exit so that the loader can be restarted.
+    '''
+
+    threads = []
+    for mapping in mappings:
+        thread = threading.Thread(target=load_table, name=mapping.name,
+                                  args=(client, connect, store, mapping, interval, index))
+        thread.daemon = True
+        thread.start()
+        threads.append(thread)
+
+    # sleep instead of join, so that Ctrl+C works
+    while all(thread.is_alive() for thread in threads):
+        time.sleep(1)
+
+    sys.exit('stopped loading: %s' % ', '.join(thread.name for thread in threads
+                                               if not thread.is_alive()))
 
 
 if __name__ == '__main__':
 
-    client = s3.S3Client('access_key', 'secret_access_key')
-    s3.end_point = "s3.end_point"
+    # loadFromOracle.py [--backfill] [config]
+    args = sys.argv[1:]
+    is_backfill = '--backfill' in args
+    if is_backfill:
+        args.remove('--backfill')
+
+    here = os.path.dirname(os.path.abspath(__file__))
+    config = args[0] if args else os.path.join(here, 'loadFromOracle.cfg')
+    mappings = load_mappings(config)
+    # the watermarks of the mappings, to resume after restarted,
+    # and the md5 of the objects uploaded, to skip the same content
+    db_file = os.path.join(here, 'loadFromOracle.db')
+    store = CheckpointStore(db_file)
+    index = ContentIndex(db_file)
+
+    oracle = ('username', 'pass', 'ip:port/sid')
+    s3_args = ('access_key', 'secret_access_key', 's3.end_point')
+
+    client = s3.S3Client(*s3_args[:2])
+    s3.end_point = s3_args[2]
 
     for bucket in client.list_buckets()[1]:
         print bucket.name
@@ -79,23 +504,12 @@ if __name__ == '__main__':
         os.system('net start OracleOraDb11g_home1TNSListener')
         os.system('net start OracleServiceORCL')
 
-    orcl = cx_Oracle.connect('username', 'pass', 'ip:port/sid')
-    cur = orcl.cursor()
-
-    now_time = datetime.datetime.now()
-    while 1:
-        begin_time = now_time + datetime.timedelta(minutes=-5)
-        end_time = datetime.datetime.now() + datetime.timedelta(minutes=-2)
-        now_time = end_time
-
-        # print datetime.datetime.now().strftime('%Y_%m_%d %H:%M:%S')
-        # print "1 ",begin_time.strftime('%Y_%m_%d %H:%M:%S')
-        # print "2 ",end_time.strftime('%Y_%m_%d %H:%M:%S')
-
-        upload_ZPFJ_PTRYZPXXB(cur, begin_time.strftime('%Y_%m_%d %H:%M:%S'), end_time.strftime('%Y_%m_%d %H:%M:%S'))
-
-        upload_ZPFJ_FJXXB(cur, begin_time.strftime('%Y_%m_%d %H:%M:%S'), end_time.strftime('%Y_%m_%d %H:%M:%S'))
+    if is_backfill:
+        for mapping in mappings:
+            backfill(store, mapping, oracle, s3_args, index_file=db_file)
+        sys.exit(0)
 
-        time.sleep(3)
+    # threaded, for the cursor is shared with the uploading threads
+    connect = lambda: cx_Oracle.connect(*oracle, threaded=True)
 
-    cur.close()
+    run(client, connect, store, mappings, index=index)
@@ -0,0 +1,218 @@
+#!/usr/bin/env python
+#coding=utf-8
+'''
+Copyright (c) 2026 the s3_rest_py contributors
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+Created on 2026-10-16
+
+@author: s3_rest_py contributors
+'''
+
+import collections
+import sys
+import threading
+
+__author__ = "s3_rest_py contributors"
+__description__ = "producer/consumer pipeline, which feeds the items to a group of worker threads."
+
+class BoundedQueue(object):
+    '''
+    A thread safe queue bounded by both the count of the items and their total size.
+
+    The size of an item is counted from `put` until `done` is called with it,
+    so it can cover the memory held by the item while it's handled, not only while queued.
+    '''
+
+    def __init__(self, max_items=100, max_bytes=64*1024*1024):
+        self.max_items = max_items
+        self.max_bytes = max_bytes
+
+        self._cond = threading.Condition()
+        self._items = collections.deque()
+        self._bytes = 0
+        self._closed = False
+
+    def _is_full(self, size):
+        if not self._items and self._bytes == 0:
+            # an item larger than max_bytes is let in alone, or it would wait forever
+            return False
+        return len(self._items) >= self.max_items or \
+               self._bytes + size > self.max_bytes
+
+    def put(self, item, size=0):
+        '''
+        Put an item into the queue, block while it's full.
+
+        :return: False if the queue has been closed, and the item isn't put.
+        '''
+
+        self._cond.acquire()
+        try:
+            while not self._closed and self._is_full(size):
+                self._cond.wait()
+            if self._closed:
+                return False
+
+            self._items.append((item, size))
+            self._bytes += size
+            self._cond.notify_all()
+            return True
+        finally:
+            self._cond.release()
+
+    def get(self):
+        '''
+        Get an item and it's size, block while the queue is empty.
+
+        :return: None if the queue is closed and nothing left.
+        '''
+
+        self._cond.acquire()
+        try:
+            while not self._items and not self._closed:
+                self._cond.wait()
+            if not self._items:
+                return None
+
+            item = self._items.popleft()
+            self._cond.notify_all()
+            return item
+        finally:
+            self._cond.release()
+
+    def done(self, size):
+        '''
+        Tell the queue an item got is handled, and it's size is released.
+        '''
+
+        self._cond.acquire()
+        try:
+            self._bytes -= size
+            self._cond.notify_all()
+        finally:
+            self._cond.release()
+
+    def close(self, discard=False):
+        '''
+        No more items can be put, `get` returns None after the queue drained.
+
+        :param discard: drop the items left in the queue.
+        '''
+
+        self._cond.acquire()
+        try:
+            self._closed = True
+            if discard:
+                for _, size in self._items:
+                    self._bytes -= size
+                self._items.clear()
+            self._cond.notify_all()
+        finally:
+            self._cond.release()
+
+class Pipeline(object):
+    '''
+    Handle the items from a producer by a group of worker threads,
+    so that producing the next items and handling the former ones run at the same time.
+
+    Usage:
+    def upload(item):
+        name, content = item
+        client.put_object('my_bucket', name, content)
+
+    pipeline = Pipeline(upload, workers=8)
+    succeeded, failed = pipeline.run((item, len(item[1])) for item in items)
+
+    An error from the handler only fails that item, it's passed to on_error if given,
+    and the item is reported in `failed` with the error.
+    If the producer raises an error, the items not handled yet are discarded,
+    the workers stop after the items in hand, then the error is raised.
+    '''
+
+    def __init__(self, handler, workers=4, max_items=100, max_bytes=64*1024*1024, on_error=None):
+        '''
+        :param handler: the function called with each item by the workers.
+        :param workers: count of the worker threads.
+        :param max_items: max count of the items produced but not handled.
+        :param max_bytes: max total size of the items produced but not handled.
+        :param on_error: the function called with the item and the sys.exc_info() when the handler fails.
+        '''
+
+        self.handler = handler
+        self.workers = workers
+        self.max_items = max_items
+        self.max_bytes = max_bytes
+        self.on_error = on_error
+
+    def _work(self, queue, lock, succeeded, failed):
+        while True:
+            got = queue.get()
+            if got is None:
+                return
+
+            item, size = got
+            try:
+                self.handler(item)
+            except Exception:
+                exc_info = sys.exc_info()
+                lock.acquire()
+                try:
+                    failed.append((item, exc_info[1]))
+                finally:
+                    lock.release()
+                if self.on_error is not None:
+                    try:
+                        self.on_error(item, exc_info)
+                    except Exception:
+                        pass
+            else:
+                lock.acquire()
+                try:
+                    succeeded[0] += 1
+                finally:
+                    lock.release()
+            finally:
+                queue.done(size)
+
+    def run(self, items):
+        '''
+        :param items: an iterator of (item, size), size is the bytes the item holds.
+
+        :return: the count of the succeeded items, and the list of (item, error) failed.
+        '''
+
+        queue = BoundedQueue(self.max_items, self.max_bytes)
+        lock = threading.Lock()
+        succeeded, failed = [0], []
+
+        threads = []
+        for _ in range(self.workers):
+            thread = threading.Thread(target=self._work, args=(queue, lock, succeeded, failed))
+            thread.daemon = True
+            thread.start()
+            threads.append(thread)
+
+        try:
+            for item, size in items:
+                queue.put(item, size)
+        except:
+            queue.close(discard=True)
+            raise
+        finally:
+            queue.close()
+            for thread in threads:
+                thread.join()
+
+        return succeeded[0], failed
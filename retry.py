@@ -0,0 +1,88 @@
+#!/usr/bin/env python
+#coding=utf-8
+'''
+Copyright (c) 2026 the s3_rest_py contributors
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+Created on 2026-10-16
+
+@author: s3_rest_py contributors
+'''
+
+import httplib
+import random
+import socket
+import time
+
+from errors import S3Error
+
+__author__ = "s3_rest_py contributors"
+__description__ = "retry policies for the requests."
+
+class RetryPolicy(object):
+    '''
+    Decide if a failed request should be tried again, and how long to wait before.
+
+    The waits grow exponentially with full jitter,
+    the n-th wait is a random time between 0 and min(max_interval, base_interval * 2 ** n),
+    so that the clients throttled at the same time don't retry in lockstep.
+
+    Network errors, 5xx responses and the errors with code in RETRYABLE_CODES are retried,
+    until max_tries reached or the deadline (seconds since the first try) would be passed,
+    then the last error is raised.
+
+    Subclass it and override is_retryable or get_interval to change the behavior.
+    '''
+
+    RETRYABLE_CODES = ('InternalError', 'RequestTimeout', 'ServiceUnavailable', 'SlowDown')
+
+    def __init__(self, max_tries=5, base_interval=0.1, max_interval=20, deadline=120):
+        self.max_tries = max_tries
+        self.base_interval = base_interval
+        self.max_interval = max_interval
+        self.deadline = deadline
+
+    def is_retryable(self, error):
+        if isinstance(error, S3Error):
+            return error.err_no >= 500 or \
+                   getattr(error, 'code', None) in self.RETRYABLE_CODES
+        return isinstance(error, (socket.error, httplib.HTTPException))
+
+    def get_interval(self, tries):
+        '''
+        :param tries: how many times tried.
+        '''
+
+        return random.uniform(0, min(self.max_interval, self.base_interval * 2 ** tries))
+
+    def call(self, func, *args, **kwargs):
+        '''
+        Call the func until it returns, or raises an error not to retry.
+        '''
+
+        start = time.time()
+        tries = 0
+        while True:
+            try:
+                return func(*args, **kwargs)
+            except Exception, e:
+                tries += 1
+                if tries >= self.max_tries or not self.is_retryable(e):
+                    raise
+
+                interval = self.get_interval(tries)
+                if self.deadline is not None and \
+                    time.time() - start + interval > self.deadline:
+                    raise
+                time.sleep(interval)
@@ -21,22 +21,47 @@ Created on 2012-4-20
 '''
 
 import datetime
-import urllib2
+import errno
+import httplib
+from hashlib import md5
+import socket
+import sys
+import threading
 import time
 import mimetypes
+import urllib
+from multiprocessing.pool import ThreadPool
 
 from errors import S3Error
-from utils import XML, hmac_sha1, calc_md5, iterable
-from crypto import DES
+from utils import XML, hmac_sha1, calc_md5, calc_file_md5, spool, iterable
+from crypto import DES, SegmentedDES, SEGMENT_HEADER_SIZE
+from connection import HTTPConnectionPool, PoolExhausted
+from retry import RetryPolicy
+from hedge import HedgeSkipped
+from singleflight import SingleFlight
+from pipeline import BoundedQueue, Pipeline
 
 __author__ = "Chine King"
 __description__ = "A client for Amazon S3 api, site: http://aws.amazon.com/documentation/s3/"
-__all__ = ['get_end_point', 'X_AMZ_ACL', 'REGION', 'ACL_PERMISSION', 'ALL_USERS_URI',
+__all__ = ['get_end_point', 'X_AMZ_ACL', 'REGION', 'ACL_PERMISSION', 'METADATA_DIRECTIVE', 'ALL_USERS_URI',
            'S3AclGrantByPersonID', 'S3AclGrantByEmail', 'S3AclGrantByURI',
-           'S3Bucket', 'S3Object', 'AmazonUser', 'S3Client', 'CryptoS3Client']
-
-ACTION_TYPES = ('PUT', 'GET', 'DELETE')
+           'S3Bucket', 'S3Object', 'S3ObjectSummary', 'AmazonUser', 'S3Client', 'CryptoS3Client']
+
+ACTION_TYPES = ('PUT', 'GET', 'DELETE', 'POST', 'HEAD')
+CHUNK_SIZE = 64 * 1024
+PART_SIZE = 8 * 1024 * 1024
+COPY_PART_SIZE = 64 * 1024 * 1024
+MULTIPART_COPY_SIZE = 256 * 1024 * 1024
+MAX_PARTS = 10000
+SHARD_PAGES = 2  # the pages of a shard listed ahead of yielding
+SINGLE_TRY = RetryPolicy(max_tries=1)
+STALE_ERRNOS = (errno.ECONNRESET, errno.EPIPE)
+HEDGE_TIMEOUT = 30  # the socket timeout if hedging without one given
+SUB_RESOURCES = ('acl', 'location', 'logging', 'notification', 'partNumber', 'policy',
+                 'requestPayment', 'torrent', 'uploadId', 'uploads', 'versionId',
+                 'versioning', 'versions', 'website')
 GMT_FORMAT = '%a, %d %b %Y %H:%M:%S GMT'
+LIST_TIME_FORMAT = '%Y-%m-%dT%H:%M:%S.%fZ'
 STRING_TO_SIGN = '''%(action)s
 %(content_md5)s
 %(content_type)s
@@ -71,6 +96,13 @@ GRANT_BY_URI = '''    <Grant>
       </Grantee>
       <Permission>%(user_permission)s</Permission>
     </Grant>'''
+COMPLETE_MULTIPART_UPLOAD = '''<CompleteMultipartUpload>
+%(parts)s
+</CompleteMultipartUpload>'''
+MULTIPART_UPLOAD_PART = '''  <Part>
+    <PartNumber>%(part_number)s</PartNumber>
+    <ETag>%(etag)s</ETag>
+  </Part>'''
 
 end_point = "s3.amazonaws.com"
 def get_end_point(bucket_name=None, obj_name=None, http=False):
@@ -108,6 +140,12 @@ region_content = '''<CreateBucketConfiguration xmlns="http://s3.amazonaws.com/do
   <LocationConstraint>%s</LocationConstraint> 
 </CreateBucketConfiguration >'''
 
+class MetadataDirective(object):
+    def __init__(self):
+        for val in ('COPY', 'REPLACE'):
+            setattr(self, val.lower(), val)
+METADATA_DIRECTIVE = MetadataDirective()
+
 class S3ACL(object):
     def __init__(self, owner, *grants):
         self.owner = owner
@@ -183,6 +221,20 @@ class S3AclGrantByURI(S3AclGrant):
             'user_permission': permission
         }
 
+_tags_cache = {}
+
+def _set_from_xml(obj, tree):
+    # one pass over the children, instead of a find for each item of the mapping.
+    cls = type(obj)
+    tags = _tags_cache.get(cls)
+    if tags is None:
+        tags = _tags_cache[cls] = dict((v, k) for k, v in cls.mapping.iteritems())
+
+    for child in tree:
+        k = tags.get(child.tag)
+        if k is not None:
+            setattr(obj, k, child.text)
+
 class S3Base(object):
     def __init__(self, **kwargs):
         if len(kwargs) > 0 and hasattr(self, 'mapping'):
@@ -199,18 +251,14 @@ class S3Bucket(S3Base):
                'create_date': 'CreationDate',
                'prefix': 'Prefix',
                'marker': 'Marker',
+               'next_marker': 'NextMarker',
                'max_keys': 'MaxKeys',
                'is_truncated': 'IsTruncated'}
 
     @classmethod
     def from_xml(cls, tree):
         bucket = cls()
-
-        for k, v in cls.mapping.iteritems():
-            tag = tree.find(v)
-            if hasattr(tag, 'text'):
-                setattr(bucket, k, tag.text)
-
+        _set_from_xml(bucket, tree)
         return bucket
 
 
@@ -223,21 +271,27 @@ class S3Object(S3Base):
                'is_truncated': 'IsTruncated',
                'date': 'Date',
                'content_length': 'Content-Length',
-               'content_type': 'Content-Type'}
+               'content_type': 'Content-Type',
+               'content_range': 'Content-Range'}
 
     def __init__(self, **kwargs):
         if 'data' in kwargs:
             self.data = kwargs.pop('data')
+        if 'stream' in kwargs:
+            self.stream = kwargs.pop('stream')
+        # from the headers of the response
+        if 'last-modified' in kwargs:
+            self.last_modified = kwargs.pop('last-modified')
+        metadata = dict((k[len('x-amz-meta-'):], v) for k, v in kwargs.iteritems()
+                        if k.startswith('x-amz-meta-'))
+        if metadata:
+            self.metadata = metadata
         super(S3Object, self).__init__(**kwargs)
 
     @classmethod
     def from_xml(cls, tree):
         obj = cls()
-
-        for k, v in cls.mapping.iteritems():
-            tag = tree.find(v)
-            if hasattr(tag, 'text'):
-                setattr(obj, k, tag.text)
+        _set_from_xml(obj, tree)
 
         owner = tree.find('Owner')
         if owner is not None:
@@ -245,6 +299,80 @@ class S3Object(S3Base):
 
         return obj
 
+class S3ObjectSummary(object):
+    '''
+    An object in the listing of a bucket, compact enough to keep millions in memory.
+    
+    It has no __dict__, size is an int, last_modified is the string as listed,
+    which is parsed into a datetime by `modified` only when asked.
+    The storage classes are interned, and the owners are shared by the objects.
+    is_prefix is True for a common prefix, with the prefix as key.
+    '''
+
+    __slots__ = ('key', 'last_modified', 'etag', 'size', 'storage_class',
+                 'owner', 'bucket', 'is_prefix', '_modified')
+
+    # (id, display name) -> AmazonUser, shared by the objects listed
+    _owners = {}
+    MAX_OWNERS = 1024
+
+    def __init__(self, key=None, last_modified=None, etag=None, size=None, storage_class=None,
+                 owner=None, bucket=None, is_prefix=False):
+        self.key = key
+        self.last_modified = last_modified
+        self.etag = etag
+        self.size = size
+        self.storage_class = storage_class
+        self.owner = owner
+        self.bucket = bucket
+        self.is_prefix = is_prefix
+        self._modified = None
+
+    @property
+    def modified(self):
+        if self._modified is None and self.last_modified:
+            self._modified = datetime.datetime.strptime(self.last_modified, LIST_TIME_FORMAT)
+        return self._modified
+
+    @classmethod
+    def _get_owner(cls, tree):
+        id_ = display_name = None
+        for child in tree:
+            if child.tag == 'ID':
+                id_ = child.text
+            elif child.tag == 'DisplayName':
+                display_name = child.text
+
+        owner = cls._owners.get((id_, display_name))
+        if owner is None:
+            if len(cls._owners) >= cls.MAX_OWNERS:
+                cls._owners.clear()
+            owner = cls._owners[(id_, display_name)] = AmazonUser(id_, display_name)
+        return owner
+
+    @classmethod
+    def from_xml(cls, tree, bucket=None):
+        obj = cls(bucket=bucket)
+
+        for child in tree:
+            tag = child.tag
+            if tag == 'Key':
+                obj.key = child.text
+            elif tag == 'LastModified':
+                obj.last_modified = child.text
+            elif tag == 'ETag':
+                obj.etag = child.text
+            elif tag == 'Size':
+                obj.size = int(child.text)
+            elif tag == 'StorageClass':
+                storage_class = child.text
+                obj.storage_class = intern(storage_class) \
+                                    if isinstance(storage_class, str) else storage_class
+            elif tag == 'Owner':
+                obj.owner = cls._get_owner(child)
+
+        return obj
+
 class AmazonUser(object):
     mapping = {'id_': 'ID',
                'display_name': 'DisplayName',
@@ -270,20 +398,71 @@ class AmazonUser(object):
     @classmethod
     def from_xml(cls, tree):
         user = cls()
+        _set_from_xml(user, tree)
+        return user
 
-        for k, v in cls.mapping.iteritems():
-            tag = tree.find(v)
-            if hasattr(tag, 'text'):
-                setattr(user, k, tag.text)
+class S3Response(object):
+    '''
+    The body of a response as a readable stream.
+    Iterate it to get the body in chunks.
+    The connection is given back to the pool when the body is read to the end, or closed.
+    '''
 
-        return user
+    def __init__(self, resp, conn, release, chunk_size=CHUNK_SIZE):
+        self.resp = resp
+        self.headers = resp.msg.dict
+        self.chunk_size = chunk_size
+
+        self._conn = conn
+        self._release = release
+
+    def _finish(self, reuse):
+        if self._conn is not None:
+            conn, self._conn = self._conn, None
+            self._release(conn, reuse)
+
+    def read(self, size=None):
+        if self._conn is None:
+            return ''
+
+        try:
+            data = self.resp.read() if size is None else self.resp.read(size)
+        except:
+            self._finish(reuse=False)
+            raise
+
+        if not data or self.resp.isclosed():
+            self._finish(reuse=not self.resp.will_close)
+        return data
+
+    def __iter__(self):
+        while True:
+            chunk = self.read(self.chunk_size)
+            if not chunk:
+                break
+            yield chunk
+
+    def close(self):
+        if self._conn is not None:
+            # the rest of the body is unread, the connection cannot be reused.
+            self.resp.close()
+            self._finish(reuse=False)
 
 class S3Request(object):
     def __init__(self, access_key, secret_access_key,
                  action, bucket_name=None, obj_name=None,
-                 data=None, content_type=None, metadata={}, amz_headers={} ):
+                 data=None, content_type=None, metadata={}, amz_headers={}, pool=None,
+                 chunk_size=CHUNK_SIZE, headers={}, retry_policy=None, block=True):
+        '''
+        data can be a string, a file-like object or an iterator of strings.
+        A file-like object is sent from it's current position in chunks of chunk_size,
+        and an iterator is spooled into a temporary file first.
+        headers are the extra http headers, such as Range, which are not signed.
+        retry_policy decides how the failed request is retried, an instance of RetryPolicy.
+        If not block, PoolExhausted is raised at once when no connection of the pool is free.
+        '''
 
-        assert action in ACTION_TYPES # action must be PUT, GET and DELETE.
+        assert action in ACTION_TYPES # action must be PUT, GET, DELETE, POST and HEAD.
 
         self.access_key = access_key
         self.secret_key = secret_access_key
@@ -292,17 +471,58 @@ class S3Request(object):
         self.bucket_name = bucket_name
         self.obj_name = obj_name
         self.data = data
+        self.chunk_size = chunk_size
+        self._prepare_data()
 
         self.content_type = content_type
         self._set_content_type()
 
         self.metadata = metadata
         self.amz_headers = amz_headers
+        self.headers = headers
 
         self.date_str = self._get_date_str()
 
         self.host = get_end_point(self.bucket_name)
         self.end_point = get_end_point(self.bucket_name, self.obj_name, True)
+        self.path = self.end_point[len('http://' + self.host):] or '/'
+
+        self.pool = pool
+        self.block = block
+        self.retry_policy = retry_policy or RetryPolicy()
+
+        self._lock = threading.Lock()
+        self._conn = None  # the connection waiting for the response, to shut down by abort
+        self.aborted = False
+
+    def _prepare_data(self):
+        self.content_length = None
+        self.content_md5 = None
+        self.spooled = None
+
+        if self.data is None:
+            return
+        if isinstance(self.data, basestring):
+            if self.data:
+                self.content_length = len(self.data)
+                self.content_md5 = calc_md5(self.data)
+            return
+
+        if hasattr(self.data, 'read'):
+            try:
+                self.data_offset = self.data.tell()
+                self.content_md5, self.content_length = calc_file_md5(self.data, self.chunk_size)
+                return
+            except (IOError, AttributeError):
+                # not seekable, such as a pipe
+                fp = self.data
+                chunks = iter(lambda: fp.read(self.chunk_size), '')
+        else:
+            chunks = self.data
+
+        self.spooled, self.content_md5, self.content_length = spool(chunks, self.chunk_size)
+        self.data = self.spooled
+        self.data_offset = 0
 
     def _get_date_str(self):
         return datetime.datetime.utcnow().strftime(GMT_FORMAT)
@@ -318,13 +538,17 @@ class S3Request(object):
         if self.bucket_name:
             path += self.bucket_name
         if self.bucket_name and self.obj_name:
-            if not self.obj_name.startswith('/'):
+            obj_name, _, query = self.obj_name.partition('?')
+            if not obj_name.startswith('/'):
                 path += '/'
-            if not ('?' in self.obj_name and '=' in self.obj_name):
-                # it seems that ?prefix='sth/'&delimiter='/' and so on cannot be added here.
-                # but ?acl is ok
-
-                path += self.obj_name
+            path += obj_name
+
+            # only the sub-resources such as ?acl, ?uploadId=... are signed,
+            # parameters like ?prefix='sth/'&delimiter='/' are not.
+            sub_resources = sorted(param for param in query.split('&')
+                                   if param.split('=', 1)[0] in SUB_RESOURCES)
+            if sub_resources:
+                path += '?' + '&'.join(sub_resources)
         elif self.bucket_name and not path.endswith('/'):
             path += '/'
 
@@ -357,9 +581,9 @@ class S3Request(object):
         headers = {
             'Date': self.date_str
         }
-        if self.data:
-            headers['Content-Length'] = len(self.data)
-            headers['Content-MD5'] = calc_md5(self.data)
+        if self.content_length is not None:
+            headers['Content-Length'] = self.content_length
+            headers['Content-MD5'] = self.content_md5
 
         if self.content_type is not None:
             headers['Content-Type'] = self.content_type
@@ -371,36 +595,156 @@ class S3Request(object):
             headers['x-amz-meta-' + k] = v
         for k, v in self.amz_headers.iteritems():
             headers['x-amz-' + k] = v
+        headers.update(self.headers)
 
         headers['Authorization'] = self._get_authorization(headers)
         return headers
 
-    def submit(self, try_times=3, try_interval=3, callback=None, include_headers=False):
-        def _get_data():
-            headers = self.get_headers()
+    def _borrow_connection(self):
+        if self.pool is not None:
+            return self.pool.get(self.host, self.block)
+        return httplib.HTTPConnection(self.host)
+
+    def _release_connection(self, conn, reuse=True):
+        if self.pool is not None:
+            self.pool.release(conn, reuse)
+        else:
+            conn.close()
+
+    def _send(self, conn, headers):
+        if not hasattr(self.data, 'read'):
+            conn.request(self.action, self.path, self.data, headers)
+            return
+
+        conn.putrequest(self.action, self.path, skip_host='Host' in headers)
+        for k, v in headers.iteritems():
+            conn.putheader(k, v)
+        conn.endheaders()
+
+        self.data.seek(self.data_offset)
+        left = self.content_length
+        while left > 0:
+            chunk = self.data.read(min(self.chunk_size, left))
+            if not chunk:
+                raise IOError('The data is shorter than the size when request created.')
+            conn.send(chunk)
+            left -= len(chunk)
+
+    def _is_stale(self, error):
+        # the errors of sending on a keep-alive connection the server has closed
+        if isinstance(error, httplib.BadStatusLine):
+            return True
+        return isinstance(error, socket.error) and not isinstance(error, socket.timeout) and \
+               error.errno in STALE_ERRNOS
+
+    def _hold_connection(self, conn):
+        self._lock.acquire()
+        try:
+            if conn is not None and self.aborted:
+                raise S3Error(-1, msg='The request to %s is aborted.' % self.path)
+            self._conn = conn
+        finally:
+            self._lock.release()
+
+    def abort(self):
+        '''
+        Abort the request from another thread, if it's waiting for the response,
+        the socket is shut down, and the request fails at once instead of waiting for the timeout.
+        The response already got, such as a stream, isn't affected.
+        '''
+
+        # shut down in the lock, or the connection may be released to another request meanwhile
+        self._lock.acquire()
+        try:
+            self.aborted = True
+            if self._conn is not None and self._conn.sock is not None:
+                try:
+                    self._conn.sock.shutdown(socket.SHUT_RDWR)
+                except socket.error:
+                    pass
+        finally:
+            self._lock.release()
+
+    def _get_response(self, headers, stream=False):
+        while True:
+            conn = self._borrow_connection()
+            resp = None
             try:
-                opener = urllib2.build_opener(urllib2.HTTPHandler)
-                req = urllib2.Request(self.end_point, data=self.data, headers=headers)
-                req.get_method = lambda: self.action
-                resp = opener.open(req)
-
-                if include_headers:
-                    return resp.read(), resp.headers.dict
-                return resp.read()
-            except urllib2.HTTPError, e:
-                tree = XML.loads(e.read())
-                raise S3Error(e.code, tree)
-
-        for i in range(try_times):
+                # connected before held, so abort always has the socket to shut down
+                if conn.sock is None:
+                    conn.connect()
+                self._hold_connection(conn)
+                try:
+                    self._send(conn, headers)
+                    resp = conn.getresponse()
+                finally:
+                    self._hold_connection(None)
+                if stream and resp.status < 300:
+                    return resp, S3Response(resp, conn, self._release_connection, self.chunk_size)
+                data = resp.read()
+            except (socket.error, httplib.HTTPException), e:
+                self._release_connection(conn, reuse=False)
+                # the server may have closed the idle keep-alive connection before the request,
+                # try again at once with another one.
+                # The other errors, such as timeouts, are left to the retry policy.
+                if resp is None and not self.aborted and getattr(conn, 'reused', False) and \
+                    self._is_stale(e):
+                    continue
+                raise
+            except:
+                self._release_connection(conn, reuse=False)
+                raise
+
+            self._release_connection(conn, reuse=not resp.will_close)
+            return resp, data
+
+    def _get_error(self, resp, data):
+        # a proxy or a load balancer may answer with an html page instead of the xml of S3,
+        # then the error is made of the status, so that it's still retried by the status.
+        if data:
             try:
-                if include_headers and callback:
-                    data, headers = _get_data()
-                    return callback(data, headers)
-                if callback:
-                    return callback(_get_data())
-                return _get_data()
-            except urllib2.URLError:
-                time.sleep(try_interval)
+                tree = XML.loads(data)
+            except SyntaxError:
+                tree = None
+            if tree is not None and tree.find('Code') is not None:
+                return S3Error(resp.status, tree)
+        return S3Error(resp.status, msg=resp.reason)
+
+    def submit(self, callback=None, include_headers=False, stream=False):
+        '''
+        Submit the request, return the body, or (body, headers) if include_headers.
+        If stream, the body is an S3Response to be read, instead of a string.
+        
+        The request is retried as the retry policy decides,
+        and the last error is raised when it gives up.
+        '''
+
+        def _get_data():
+            # a new date for each try, or the request may be too skewed after long waits.
+            self.date_str = self._get_date_str()
+            headers = self.get_headers()
+            resp, data = self._get_response(headers, stream)
+
+            if resp.status >= 300:
+                raise self._get_error(resp, data)
+
+            if include_headers:
+                return data, resp.msg.dict
+            return data
+
+        def _submit():
+            if include_headers and callback:
+                data, headers = _get_data()
+                return callback(data, headers)
+            if callback:
+                return callback(_get_data())
+            return _get_data()
+
+        try:
+            return self.retry_policy.call(_submit)
+        finally:
+            if self.spooled is not None:
+                self.spooled.close()
 
 class S3Client(object):
     '''
@@ -410,16 +754,51 @@ class S3Client(object):
     client = S3Client('your_access_key', 'your_secret_access_key') # init
     client.upload_file('/local_path/file_name', 'my_bucket_name', 'my_folder/file_name') 
     # call the Amazon S3 api
+
+    The client keeps the http connections alive in a pool shared by all the requests,
+    max_connections limits the connections opened to one host at the same time,
+    and idle_timeout is the seconds an unused connection kept in the pool.
+    File-like data is sent in chunks of chunk_size bytes.
+    The failed requests are retried as retry_policy decides, an instance of RetryPolicy,
+    which retries with exponential backoff as default.
+    If cache is given, an instance of ObjectCache or DiskObjectCache,
+    the objects got entirely by get_object are cached and revalidated with the server before served.
+    With coalesce, the concurrent get_object calls of the same object, range and headers
+    share one request, and all of them get it's result or it's error.
+    If hedge_policy is given, an instance of HedgePolicy, a get_object not answered in time
+    is sent again on another connection if one is free, the first answered is taken
+    and the other aborted. The connections have a timeout of HEDGE_TIMEOUT then if none given.
+    Call client.close() to close the idle connections when the client is no longer used.
     '''
 
     def __init__(self, access_key, secret_access_key,
-                 canonical_user_id=None, user_display_name=None):
+                 canonical_user_id=None, user_display_name=None,
+                 max_connections=10, idle_timeout=60, timeout=None, chunk_size=CHUNK_SIZE,
+                 retry_policy=None, cache=None, coalesce=False, hedge_policy=None):
         self.access_key = access_key
         self.secret_key = secret_access_key
 
         if canonical_user_id and user_display_name:
             self.owner = AmazonUser(canonical_user_id, user_display_name)
 
+        if hedge_policy is not None and timeout is None:
+            # the attempt lost can't be aborted while connecting, it must not hang there
+            timeout = HEDGE_TIMEOUT
+        self.pool = HTTPConnectionPool(max_connections, idle_timeout, timeout)
+        self.chunk_size = chunk_size
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.cache = cache
+        self._flight = SingleFlight() if coalesce else None
+        self.hedge_policy = hedge_policy
+
+    def close(self):
+        self.pool.close()
+
+    def _get_request(self, action, **kwargs):
+        kwargs.setdefault('retry_policy', self.retry_policy)
+        return S3Request(self.access_key, self.secret_key, action,
+                         pool=self.pool, chunk_size=self.chunk_size, **kwargs)
+
     def set_owner(self, owner):
         self.owner = owner
 
@@ -443,7 +822,7 @@ class S3Client(object):
         :return 1: list of buckets, each one is an instance of S3Bucket.
         '''
 
-        req = S3Request(self.access_key, self.secret_key, 'GET')
+        req = self._get_request('GET')
         return req.submit(callback=self._parse_list_buckets)
 
     def put_bucket(self, bucket_name, x_amz_acl=X_AMZ_ACL.private, region=REGION.standard):
@@ -493,8 +872,7 @@ class S3Client(object):
         else:
             data = None
 
-        req = S3Request(self.access_key, self.secret_key, 'PUT',
-                        bucket_name=bucket_name, data=data, amz_headers=amz_headers)
+        req = self._get_request('PUT', bucket_name=bucket_name, data=data, amz_headers=amz_headers)
 
         return req.submit()
 
@@ -510,28 +888,32 @@ class S3Client(object):
 
         acl = str(S3ACL(owner, *grants))
 
-        req = S3Request(self.access_key, self.secret_key, 'PUT',
-                        bucket_name=bucket_name, obj_name='?acl', data=acl)
+        req = self._get_request('PUT', bucket_name=bucket_name, obj_name='?acl', data=acl)
         return req.submit()
 
 
-    def _parse_get_bucket(self, data):
-        tree = XML.loads(data)
-        bucket = S3Bucket.from_xml(tree)
-        has_next = True if bucket.is_truncated == 'true' else False
-
+    def _parse_get_bucket(self, stream):
+        # parsed while the body is read, each child of the root is dropped once handled,
+        # so the whole body or tree is never in memory.
+        bucket = S3Bucket()
         objs = []
-        for ele in tree.findall('Contents'):
-            obj = S3Object.from_xml(ele)
-            obj.bucket = bucket
-            objs.append(obj)
-
         common_prefix = []
-        for ele in tree.findall('CommonPrefixes'):
-            prefix = ele.find('Prefix')
-            if hasattr(prefix, 'text'):
-                common_prefix.append(prefix.text)
 
+        try:
+            for ele in XML.iterparse(stream):
+                if ele.tag == 'Contents':
+                    objs.append(S3ObjectSummary.from_xml(ele, bucket))
+                elif ele.tag == 'CommonPrefixes':
+                    prefix = ele.find('Prefix')
+                    if hasattr(prefix, 'text'):
+                        common_prefix.append(prefix.text)
+                else:
+                    _set_from_xml(bucket, (ele, ))
+        finally:
+            if hasattr(stream, 'close'):
+                stream.close()
+
+        has_next = True if getattr(bucket, 'is_truncated', None) == 'true' else False
         return objs, common_prefix, has_next
 
     def get_bucket(self, bucket_name, **kwargs):
@@ -540,7 +922,7 @@ class S3Client(object):
         
         :param bucket_name
         
-        :return 0: list of objects in the bucket, each one is an instance of S3Object.
+        :return 0: list of objects in the bucket, each one is an instance of S3ObjectSummary.
         :return 1: the common prefix list, always when prefix parameter in kwargs.
         :return 2: if has next objects.
         '''
@@ -553,23 +935,253 @@ class S3Client(object):
         if max_keys != 1000:
             args['max-keys'] = max_keys
 
-        param = '&'.join(('%s=%s' % (k, v) for k, v in args.iteritems()))
+        param = '&'.join(('%s=%s' % (k, urllib.quote(self._to_str(v), safe=''))
+                          for k, v in args.iteritems()))
         if not param:
             param = None
         else:
             param = '?' + param
 
-        req = S3Request(self.access_key, self.secret_key, 'GET',
-                        bucket_name=bucket_name, obj_name=param)
-        return req.submit(callback=self._parse_get_bucket)
+        req = self._get_request('GET', bucket_name=bucket_name, obj_name=param)
+        return req.submit(stream=True, callback=self._parse_get_bucket)
 
-    def _parse_get_acl(self, data):
-        tree = XML.loads(data)
+    def _to_str(self, value):
+        if isinstance(value, unicode):
+            return value.encode('utf-8')
+        return str(value)
 
-        owner = AmazonUser.from_xml(tree.find('Owner'))
+    def _get_next_marker(self, bucket, objs, common_prefix):
+        if getattr(bucket, 'next_marker', None):
+            return bucket.next_marker
+
+        keys = [obj.key for obj in objs[-1:]] + common_prefix[-1:]
+        return max(keys) if keys else None
+
+    def iter_objects(self, bucket_name, prefix=None, delimiter=None, max_keys=1000, prefetch=False,
+                     marker=None):
+        '''
+        Iterate all the objects in the bucket, the pages are got one by one when needed.
+        
+        :param bucket_name
+        :param prefix: only the objects whose name starts with the prefix.
+        :param delimiter: the objects whose name contains the delimiter after the prefix are
+                          grouped as common prefixes, which are yielded with is_prefix True
+                          and the prefix as key, in order with the objects.
+        :param max_keys: the objects in a page.
+        :param prefetch: get the next page in the background while the current one is iterated.
+        :param marker: only the objects whose name is after the marker.
+        
+        :return: a generator of S3ObjectSummary.
+        '''
+
+        kwargs = {'prefix': prefix, 'delimiter': delimiter, 'max_keys': max_keys}
+
+        pool = ThreadPool(1) if prefetch else None
+        try:
+            page = self.get_bucket(bucket_name, marker=marker, **kwargs)
+            while True:
+                objs, common_prefix, has_next = page
+
+                last_marker = marker
+                marker = self._get_next_marker(objs[0].bucket if objs else None, objs, common_prefix) \
+                         if has_next else None
+                if marker is not None and marker == last_marker:
+                    raise S3Error(-1, msg='The listing of bucket %s does not move on from %s.'
+                                          % (bucket_name, marker))
+                next_page = None
+                if marker is not None and pool is not None:
+                    next_page = pool.apply_async(self.get_bucket, (bucket_name, ),
+                                                 dict(kwargs, marker=marker))
+
+                items = list(objs)
+                for key in common_prefix:
+                    items.append(S3ObjectSummary(key=key, is_prefix=True))
+                if common_prefix:
+                    items.sort(key=lambda obj: obj.key)
+                for obj in items:
+                    yield obj
+
+                if marker is None:
+                    break
+                if next_page is not None:
+                    page = next_page.get()
+                else:
+                    page = self.get_bucket(bucket_name, marker=marker, **kwargs)
+        finally:
+            if pool is not None:
+                pool.terminate()
+
+    def _list_shard(self, bucket_name, shard, max_keys, queue):
+        '''
+        List the shard into the queue page by page, as (page, None).
+        
+        :return: False if the queue is closed, and the listing stopped.
+        '''
+
+        prefix, low, high = shard
+
+        page = []
+        for obj in self.iter_objects(bucket_name, prefix=prefix, max_keys=max_keys, marker=low):
+            if high is not None and obj.key > high:
+                break
+            page.append(obj)
+            if len(page) >= max_keys:
+                if not queue.put((page, None)):
+                    return False
+                page = []
+        return not page or queue.put((page, None))
+
+    def iter_objects_parallel(self, bucket_name, prefix=None, delimiter='/', split_points=None,
+                              concurrency=8, ordered=True, max_keys=1000):
+        '''
+        Iterate all the objects in the bucket, listing the shards of the keys at the same time.
+        
+        :param bucket_name
+        :param prefix: only the objects whose name starts with the prefix.
+        :param delimiter: if split_points not given, the bucket is listed with the delimiter first,
+                          each common prefix found is a shard.
+        :param split_points: the sorted keys to split the listing at,
+                             each shard lists the keys after a point, until the next one included.
+        :param concurrency: how many shards are listed at the same time.
+        :param ordered: yield the objects in the order of their names, or as the pages arrive.
+        :param max_keys: the objects in a page.
+        
+        The pages are yielded as they arrive, at most SHARD_PAGES pages of each shard listing are
+        kept in memory, and in order, only the shards within concurrency from the one yielding
+        are listed, so the memory doesn't grow with the bucket.
+        Split points are needed if the most of the keys are under one common prefix.
+        
+        :return: a generator of S3ObjectSummary, without the common prefixes.
+        '''
+
+        # the entries in order, each is an object, or None for the next shard
+        entries = []
+        shards = []
+        if split_points:
+            points = [None] + list(split_points)
+            for low, high in zip(points, points[1:] + [None]):
+                shards.append((prefix, low, high))
+                entries.append(None)
+        else:
+            for obj in self.iter_objects(bucket_name, prefix=prefix, delimiter=delimiter,
+                                         max_keys=max_keys):
+                if obj.is_prefix:
+                    shards.append((obj.key, None, None))
+                    entries.append(None)
+                else:
+                    entries.append(obj)
+
+        # in order, each shard has it's own queue, else all the shards share one
+        if ordered:
+            queues = [BoundedQueue(SHARD_PAGES) for _ in shards]
+        else:
+            shared = BoundedQueue(SHARD_PAGES * concurrency)
+        cond = threading.Condition()
+        state = {'next': 0, 'yielding': 0, 'workers': 0, 'stopped': False}
+
+        def _work():
+            try:
+                while True:
+                    cond.acquire()
+                    try:
+                        while ordered and not state['stopped'] and \
+                            state['next'] >= state['yielding'] + concurrency:
+                            cond.wait()
+                        if state['stopped'] or state['next'] >= len(shards):
+                            return
+                        shard_no = state['next']
+                        state['next'] += 1
+                    finally:
+                        cond.release()
+
+                    queue = queues[shard_no] if ordered else shared
+                    try:
+                        if not self._list_shard(bucket_name, shards[shard_no], max_keys, queue):
+                            return
+                    except Exception:
+                        queue.put((None, sys.exc_info()))
+                        return
+                    finally:
+                        if ordered:
+                            queue.close()
+            finally:
+                if not ordered:
+                    cond.acquire()
+                    try:
+                        state['workers'] -= 1
+                        if state['workers'] == 0:
+                            shared.close()
+                    finally:
+                        cond.release()
+
+        def _iter_queue(queue):
+            while True:
+                got = queue.get()
+                if got is None:
+                    return
+                (page, exc_info), _ = got
+                if exc_info is not None:
+                    raise exc_info[0], exc_info[1], exc_info[2]
+                for obj in page:
+                    yield obj
+
+        state['workers'] = min(concurrency, len(shards))
+        for _ in range(state['workers']):
+            thread = threading.Thread(target=_work)
+            thread.daemon = True
+            thread.start()
+
+        try:
+            if ordered:
+                shard_no = 0
+                for entry in entries:
+                    if entry is not None:
+                        yield entry
+                        continue
+
+                    for obj in _iter_queue(queues[shard_no]):
+                        yield obj
+                    queues[shard_no] = None
+                    shard_no += 1
+                    cond.acquire()
+                    try:
+                        state['yielding'] = shard_no
+                        cond.notify_all()
+                    finally:
+                        cond.release()
+            else:
+                for entry in entries:
+                    if entry is not None:
+                        yield entry
+                if shards:
+                    for obj in _iter_queue(shared):
+                        yield obj
+        finally:
+            cond.acquire()
+            try:
+                state['stopped'] = True
+                cond.notify_all()
+            finally:
+                cond.release()
+            for queue in (queues if ordered else [shared]):
+                if queue is not None:
+                    queue.close(discard=True)
+
+    def _parse_get_acl(self, stream):
+        owner = None
+        grant_list = []
+        try:
+            for ele in XML.iterparse(stream):
+                if ele.tag == 'Owner':
+                    owner = AmazonUser.from_xml(ele)
+                elif ele.tag == 'AccessControlList':
+                    grant_list = ele.findall('Grant')
+        finally:
+            if hasattr(stream, 'close'):
+                stream.close()
 
         grants = {}
-        for grant in tree.findall('AccessControlList/Grant'):
+        for grant in grant_list:
             user = AmazonUser.from_xml(grant.find('Grantee'))
             permission = grant.find('Permission').text
 
@@ -595,9 +1207,8 @@ class S3Client(object):
                    permission value can be  FULL_CONTROL | WRITE | WRITE_ACP | READ | READ_ACP
         '''
 
-        req = S3Request(self.access_key, self.secret_key, 'GET',
-                        bucket_name=bucket_name, obj_name='?acl')
-        return req.submit(callback=self._parse_get_acl)
+        req = self._get_request('GET', bucket_name=bucket_name, obj_name='?acl')
+        return req.submit(stream=True, callback=self._parse_get_acl)
 
     def delete_bucket(self, bucket_name):
         '''
@@ -606,8 +1217,7 @@ class S3Client(object):
         :param bucket_name
         '''
 
-        req = S3Request(self.access_key, self.secret_key, 'DELETE',
-                        bucket_name=bucket_name)
+        req = self._get_request('DELETE', bucket_name=bucket_name)
         return req.submit()
 
     def put_object(self, bucket_name, obj_name, data, content_type=None,
@@ -617,7 +1227,8 @@ class S3Client(object):
         
         :param bucket_name: which bucket the object puts into.
         :param obj_name: the obj name, as the format: 'folder/file.txt' or 'file.txt'.
-        :param data: the content of the obj.
+        :param data: the content of the obj, a string, a file-like object or an iterator of strings.
+                     A file-like object is read in chunks, so it's never loaded into memory entirely.
         :param content_type
         :param metadata: the meta data as amazon defined.
         :param amz_header: the extra headers which amazon defined.
@@ -632,10 +1243,9 @@ class S3Client(object):
         the method 'upload_file' is recommended as the high-level api.
         '''
 
-        req = S3Request(self.access_key, self.secret_key, 'PUT',
-                        bucket_name=bucket_name, obj_name=obj_name, data=data,
-                        content_type=content_type, metadata=metadata, amz_headers=amz_headers)
-        return req.submit()
+        req = self._get_request('PUT', bucket_name=bucket_name, obj_name=obj_name, data=data,
+                                content_type=content_type, metadata=metadata, amz_headers=amz_headers)
+        return self._submit_write(bucket_name, obj_name, req)
 
     def put_object_acl(self, bucket_name, obj_name, owner, *grants):
         '''
@@ -650,29 +1260,187 @@ class S3Client(object):
 
         acl = str(S3ACL(owner, *grants))
 
-        req = S3Request(self.access_key, self.secret_key, 'PUT',
-                        bucket_name=bucket_name, obj_name='%s?acl'%obj_name, data=acl)
+        req = self._get_request('PUT', bucket_name=bucket_name, obj_name='%s?acl'%obj_name, data=acl)
         return req.submit()
 
 
-    def get_object(self, bucket_name, obj_name):
+    def _get_range_headers(self, byte_range, headers):
+        if byte_range is None:
+            return headers
+
+        headers = dict(headers)
+        headers['Range'] = 'bytes=%d-%d' % byte_range
+        return headers
+
+    def get_object(self, bucket_name, obj_name, byte_range=None, headers={}):
         '''
         Get object.
         
         :param bucket_name: the bucket contains the object.
         :param obj_name: the object's name, as the format: 'folder/file.txt' or 'file.txt'.
+        :param byte_range: (start, end) of the content to get, both included.
+        :param headers: the extra http headers, If-Match eg.
         
         :return: instance of S3Object, the 'data' property is the content of the object.
+        
+        With the cache of the client, the whole object without extra headers is got from the cache,
+        a 304 Not Modified of the server means the content cached is still the latest.
+        With coalesce of the client, the calls at the same time share the same S3Object returned.
+        '''
+
+        if self._flight is not None:
+            key = (bucket_name, obj_name, byte_range, tuple(sorted(headers.items())))
+            return self._flight.do(key, self._get_object, bucket_name, obj_name, byte_range, headers)
+        return self._get_object(bucket_name, obj_name, byte_range, headers)
+
+    def _get_object(self, bucket_name, obj_name, byte_range, headers):
+        if self.cache is not None and byte_range is None and not headers:
+            return self._get_cached_object(bucket_name, obj_name)
+
+        data, resp_headers = self._fetch_object(bucket_name, obj_name,
+                                                self._get_range_headers(byte_range, headers))
+        return S3Object(data=data, **resp_headers)
+
+    def _fetch_object(self, bucket_name, obj_name, headers):
+        '''
+        :return: the content and the response headers of the object, hedged if the client does.
+        '''
+
+        if self.hedge_policy is None:
+            req = self._get_request('GET', bucket_name=bucket_name, obj_name=obj_name, headers=headers)
+            return req.submit(include_headers=True)
+
+        def _get_hedged():
+            lock = threading.Lock()
+            reqs = []
+            settled = [False]
+
+            def _get():
+                # tried once, the hedged call with reading the body is retried as a whole.
+                # The hedge doesn't wait for a connection, it's skipped if none is free.
+                lock.acquire()
+                try:
+                    req = self._get_request('GET', bucket_name=bucket_name, obj_name=obj_name,
+                                            headers=headers, retry_policy=SINGLE_TRY, block=not reqs)
+                    reqs.append(req)
+                    if settled[0]:
+                        req.abort()
+                finally:
+                    lock.release()
+
+                try:
+                    return req.submit(include_headers=True, stream=True)
+                except PoolExhausted:
+                    raise HedgeSkipped()
+
+            try:
+                stream, resp_headers = self.hedge_policy.call(_get, cancel=lambda got: got[0].close())
+            finally:
+                # the attempt lost is still waiting for the response, it holds the connection
+                lock.acquire()
+                try:
+                    settled[0] = True
+                finally:
+                    lock.release()
+                for req in reqs:
+                    req.abort()
+
+            try:
+                return stream.read(), resp_headers
+            finally:
+                stream.close()
+
+        return self.retry_policy.call(_get_hedged)
+
+    def _get_cached_object(self, bucket_name, obj_name):
+        key = (bucket_name, obj_name)
+        version = self.cache.get_version(key)
+        got = self.cache.get(key)
+
+        headers = {}
+        if got is not None:
+            entry, data = got
+            if self.cache.is_fresh(entry):
+                return S3Object(data=data, **entry.headers)
+            if entry.etag:
+                headers['If-None-Match'] = entry.etag
+            if entry.last_modified:
+                headers['If-Modified-Since'] = entry.last_modified
+
+        try:
+            data, resp_headers = self._fetch_object(bucket_name, obj_name, headers)
+        except S3Error, e:
+            if got is None or e.err_no != 304:
+                raise
+            self.cache.touch(entry)
+            return S3Object(data=data, **entry.headers)
+
+        self.cache.put(key, data, resp_headers, version)
+        return S3Object(data=data, **resp_headers)
+
+    def _invalidate(self, bucket_name, obj_name):
+        if self.cache is not None:
+            self.cache.remove((bucket_name, obj_name))
+
+    def _submit_write(self, bucket_name, obj_name, req, **kwargs):
+        '''
+        Submit the request which writes the object, it's removed from the cache before and after,
+        a get_object at the same time doesn't cache the content fetched before written,
+        for the version of the key in the cache is changed.
+        '''
+
+        self._invalidate(bucket_name, obj_name)
+        try:
+            return req.submit(**kwargs)
+        finally:
+            self._invalidate(bucket_name, obj_name)
+
+    def stat_object(self, bucket_name, obj_name, headers={}):
+        '''
+        Get the metadata of the object by HEAD, without the content.
+        
+        :param bucket_name: the bucket contains the object.
+        :param obj_name: the object's name, as the format: 'folder/file.txt' or 'file.txt'.
+        :param headers: the extra http headers, If-None-Match eg.
+        
+        :return: instance of S3Object, with etag, last_modified, content_type, content_length,
+                 size as an int, and metadata as a dict if the object has any.
+                 S3Error with err_no 404 is raised if the object doesn't exist,
+                 and with err_no 304 (or 412) if a conditional header in headers matches
+                 (or fails), nothing is returned then.
+        '''
+
+        def _parse(data, headers):
+            obj = S3Object(**headers)
+            obj.key = obj_name
+            if getattr(obj, 'content_length', None) is not None:
+                obj.size = int(obj.content_length)
+            return obj
+
+        req = self._get_request('HEAD', bucket_name=bucket_name, obj_name=obj_name, headers=headers)
+        return req.submit(include_headers=True, callback=_parse)
+
+    def get_object_stream(self, bucket_name, obj_name, byte_range=None, headers={}):
+        '''
+        Get object, without reading the content into memory.
+        
+        :param bucket_name: the bucket contains the object.
+        :param obj_name: the object's name, as the format: 'folder/file.txt' or 'file.txt'.
+        :param byte_range: (start, end) of the content to get, both included.
+        :param headers: the extra http headers, If-Match eg.
+        
+        :return: instance of S3Object, the 'stream' property is an S3Response,
+                 read it, or iterate it to get the content in chunks, and close it when done.
         '''
 
-        req = S3Request(self.access_key, self.secret_key, 'GET',
-                        bucket_name=bucket_name, obj_name=obj_name)
-        return req.submit(include_headers=True, callback=lambda data, headers: S3Object(data=data, **headers))
+        req = self._get_request('GET', bucket_name=bucket_name, obj_name=obj_name,
+                                headers=self._get_range_headers(byte_range, headers))
+        return req.submit(include_headers=True, stream=True,
+                          callback=lambda stream, headers: S3Object(stream=stream, **headers))
 
     def get_object_acl(self, bucket_name, obj_name):
-        req = S3Request(self.access_key, self.secret_key, 'GET',
-                        bucket_name=bucket_name, obj_name='%s?acl'%obj_name)
-        return req.submit(callback=self._parse_get_acl)
+        req = self._get_request('GET', bucket_name=bucket_name, obj_name='%s?acl'%obj_name)
+        return req.submit(stream=True, callback=self._parse_get_acl)
 
     def delete_object(self, bucket_name, obj_name):
         '''
@@ -682,12 +1450,293 @@ class S3Client(object):
         :param obj_name: the object's name, as the format: 'folder/file.txt' or 'file.txt'.
         '''
 
-        req = S3Request(self.access_key, self.secret_key, 'DELETE',
-                        bucket_name=bucket_name, obj_name=obj_name)
+        req = self._get_request('DELETE', bucket_name=bucket_name, obj_name=obj_name)
+        return self._submit_write(bucket_name, obj_name, req)
+
+    def initiate_multipart_upload(self, bucket_name, obj_name, content_type=None,
+                                  metadata={}, amz_headers={}):
+        '''
+        Initiate a multipart upload.
+        The parts uploaded by 'upload_part' are combined into the object
+        when 'complete_multipart_upload' called.
+        
+        :param bucket_name: which bucket the object puts into.
+        :param obj_name: the obj name, as the format: 'folder/file.txt' or 'file.txt'.
+        :param content_type
+        :param metadata: the meta data as amazon defined.
+        :param amz_header: the extra headers which amazon defined.
+        
+        :return: the upload id.
+        '''
+
+        if content_type is None:
+            content_type = mimetypes.guess_type(obj_name)[0]
+
+        req = self._get_request('POST', bucket_name=bucket_name, obj_name='%s?uploads'%obj_name,
+                                content_type=content_type, metadata=metadata, amz_headers=amz_headers)
+        return req.submit(callback=lambda data: XML.loads(data).find('UploadId').text)
+
+    def upload_part(self, bucket_name, obj_name, upload_id, part_number, data):
+        '''
+        Upload a part of the multipart upload.
+        
+        :param upload_id: the id returned by 'initiate_multipart_upload'.
+        :param part_number: from 1 to 10000, the parts are combined in the order of the number.
+        :param data: the content of the part, at least 5 MB except the last part.
+        
+        :return: the ETag of the part.
+        '''
+
+        req = self._get_request('PUT', bucket_name=bucket_name,
+                                obj_name='%s?partNumber=%d&uploadId=%s'%(obj_name, part_number, upload_id),
+                                data=data)
+        return req.submit(include_headers=True, callback=lambda data, headers: headers['etag'])
+
+    def _parse_result(self, data):
+        tree = XML.loads(data)
+        # an error may come with 200 OK, after the server begins to combine or copy the parts.
+        if tree.tag == 'Error':
+            raise S3Error(200, tree)
+
+        return S3Object.from_xml(tree)
+
+    def complete_multipart_upload(self, bucket_name, obj_name, upload_id, parts):
+        '''
+        Complete the multipart upload, combine the parts into the object.
+        
+        :param upload_id: the id returned by 'initiate_multipart_upload'.
+        :param parts: list of (part_number, etag) of all the parts uploaded.
+        
+        :return: instance of S3Object, with the key and the etag.
+        '''
+
+        data = COMPLETE_MULTIPART_UPLOAD % {
+            'parts': '\n'.join(MULTIPART_UPLOAD_PART % {'part_number': part_number, 'etag': etag}
+                               for part_number, etag in sorted(parts))
+        }
+
+        req = self._get_request('POST', bucket_name=bucket_name,
+                                obj_name='%s?uploadId=%s'%(obj_name, upload_id), data=data)
+        return self._submit_write(bucket_name, obj_name, req, callback=self._parse_result)
+
+    def abort_multipart_upload(self, bucket_name, obj_name, upload_id):
+        '''
+        Abort the multipart upload, the parts uploaded are deleted.
+        
+        :param upload_id: the id returned by 'initiate_multipart_upload'.
+        '''
+
+        req = self._get_request('DELETE', bucket_name=bucket_name,
+                                obj_name='%s?uploadId=%s'%(obj_name, upload_id))
         return req.submit()
 
+    def put_object_multipart(self, bucket_name, obj_name, fp, size=None,
+                             part_size=PART_SIZE, concurrency=4, content_type=None,
+                             metadata={}, amz_headers={}):
+        '''
+        Put object into a bucket by multipart upload, the parts are uploaded concurrently.
+        
+        :param bucket_name: which bucket the object puts into.
+        :param obj_name: the obj name, as the format: 'folder/file.txt' or 'file.txt'.
+        :param fp: a seekable file-like object, the content is read from it's current position.
+        :param size: the size of the content, as default read to the end of fp.
+        :param part_size: size of each part, at least 5 MB,
+                          it's enlarged when the content needs more than 10000 parts.
+        :param concurrency: how many parts are uploaded at the same time.
+        
+        Each uploading part is read into memory, so about part_size * concurrency bytes are used.
+        If any part fails, the multipart upload is aborted.
+        
+        :return: instance of S3Object, with the key and the etag.
+        '''
+
+        offset = fp.tell()
+        if size is None:
+            fp.seek(0, 2)
+            size = fp.tell() - offset
+            fp.seek(offset)
+
+        part_size = max(part_size, -(-size // MAX_PARTS))
+        parts_count = max(1, -(-size // part_size))
+        lock = threading.Lock()
+
+        upload_id = self.initiate_multipart_upload(bucket_name, obj_name, content_type=content_type,
+                                                   metadata=metadata, amz_headers=amz_headers)
+
+        def _upload(part_number):
+            start = (part_number - 1) * part_size
+            lock.acquire()
+            try:
+                fp.seek(offset + start)
+                data = fp.read(min(part_size, size - start))
+            finally:
+                lock.release()
+
+            return part_number, self.upload_part(bucket_name, obj_name, upload_id, part_number, data)
+
+        return self._complete_parts(bucket_name, obj_name, upload_id, _upload, parts_count, concurrency)
+
+    def _complete_parts(self, bucket_name, obj_name, upload_id, func, parts_count, concurrency):
+        '''
+        Call func with each part number concurrently, which returns the (part_number, etag),
+        then complete the multipart upload, or abort it if any part fails.
+        '''
+
+        try:
+            pool = ThreadPool(concurrency)
+            try:
+                parts = pool.map(func, range(1, parts_count + 1))
+            finally:
+                pool.terminate()
+        except:
+            exc_info = sys.exc_info()
+            try:
+                self.abort_multipart_upload(bucket_name, obj_name, upload_id)
+            except (S3Error, socket.error, httplib.HTTPException):
+                pass
+            raise exc_info[0], exc_info[1], exc_info[2]
+
+        return self.complete_multipart_upload(bucket_name, obj_name, upload_id, parts)
+
+    def _get_copy_source(self, bucket_name, obj_name):
+        return '/%s/%s' % (bucket_name, urllib.quote(obj_name))
+
+    def copy_object(self, src_bucket_name, src_obj_name, bucket_name, obj_name,
+                    metadata_directive=METADATA_DIRECTIVE.copy, content_type=None,
+                    metadata={}, amz_headers={}):
+        '''
+        Copy an object inside S3, the content isn't transferred through the client.
+        
+        :param src_bucket_name: the bucket contains the source object.
+        :param src_obj_name: the source object's name.
+        :param bucket_name: which bucket the object copies into, can be the source bucket.
+        :param obj_name: the new object's name.
+        :param metadata_directive: METADATA_DIRECTIVE.copy keeps the metadata and the content type of the source,
+                                   METADATA_DIRECTIVE.replace sets them by metadata and content_type.
+        :param amz_headers: the extra headers which amazon defined, {'acl': X_AMZ_ACL.public_read} eg.
+        
+        An object larger than 5 GB can only be copied by 'copy_object_multipart'.
+        
+        :return: instance of S3Object, with the etag and the last_modified.
+        '''
+
+        amz_headers = dict(amz_headers)
+        amz_headers['copy-source'] = self._get_copy_source(src_bucket_name, src_obj_name)
+        amz_headers['metadata-directive'] = metadata_directive
+        if metadata_directive != METADATA_DIRECTIVE.replace:
+            content_type, metadata = None, {}
+
+        req = self._get_request('PUT', bucket_name=bucket_name, obj_name=obj_name,
+                                content_type=content_type, metadata=metadata, amz_headers=amz_headers)
+        return self._submit_write(bucket_name, obj_name, req, callback=self._parse_result)
+
+    def upload_part_copy(self, bucket_name, obj_name, upload_id, part_number,
+                         src_bucket_name, src_obj_name, byte_range=None, amz_headers={}):
+        '''
+        Copy a part of the multipart upload from an object inside S3.
+        
+        :param upload_id: the id returned by 'initiate_multipart_upload'.
+        :param part_number: from 1 to 10000, the parts are combined in the order of the number.
+        :param byte_range: (start, end) of the source to copy, both included, None for the whole source.
+        :param amz_headers: the extra headers which amazon defined, {'copy-source-if-match': etag} eg.
+        
+        :return: the ETag of the part.
+        '''
+
+        amz_headers = dict(amz_headers)
+        amz_headers['copy-source'] = self._get_copy_source(src_bucket_name, src_obj_name)
+        if byte_range is not None:
+            amz_headers['copy-source-range'] = 'bytes=%d-%d' % byte_range
+
+        req = self._get_request('PUT', bucket_name=bucket_name,
+                                obj_name='%s?partNumber=%d&uploadId=%s'%(obj_name, part_number, upload_id),
+                                amz_headers=amz_headers)
+        return req.submit(callback=lambda data: self._parse_result(data).etag)
+
+    def copy_object_multipart(self, src_bucket_name, src_obj_name, bucket_name, obj_name,
+                              part_size=COPY_PART_SIZE, concurrency=8,
+                              metadata_directive=METADATA_DIRECTIVE.copy, content_type=None,
+                              metadata={}, amz_headers={}):
+        '''
+        Copy an object inside S3 by multipart upload, the parts are copied concurrently.
+        
+        :param part_size: size of each part, it's enlarged when the object needs more than 10000 parts.
+        :param concurrency: how many parts are copied at the same time.
+        :param metadata_directive: as 'copy_object', the metadata of the source is got by 'stat_object'.
+        
+        The parts are copied only if the source's etag is unchanged,
+        if any part fails, the multipart upload is aborted.
+        
+        :return: instance of S3Object, with the key and the etag.
+        '''
+
+        src = self.stat_object(src_bucket_name, src_obj_name)
+        if metadata_directive != METADATA_DIRECTIVE.replace:
+            content_type = getattr(src, 'content_type', None)
+            metadata = getattr(src, 'metadata', {})
+
+        size = src.size
+        part_size = max(part_size, -(-size // MAX_PARTS))
+        parts_count = max(1, -(-size // part_size))
+
+        upload_id = self.initiate_multipart_upload(bucket_name, obj_name, content_type=content_type,
+                                                   metadata=metadata, amz_headers=amz_headers)
+
+        def _copy(part_number):
+            start = (part_number - 1) * part_size
+            byte_range = (start, min(size, start + part_size) - 1) if size else None
+            return part_number, self.upload_part_copy(bucket_name, obj_name, upload_id, part_number,
+                                                      src_bucket_name, src_obj_name, byte_range,
+                                                      amz_headers={'copy-source-if-match': src.etag})
+
+        return self._complete_parts(bucket_name, obj_name, upload_id, _copy, parts_count, concurrency)
+
+    def copy_prefix(self, src_bucket_name, src_prefix, bucket_name, prefix, concurrency=16,
+                    multipart_size=MULTIPART_COPY_SIZE, metadata_directive=METADATA_DIRECTIVE.copy,
+                    amz_headers={}):
+        '''
+        Copy all the objects under a prefix to another prefix inside S3, many objects at the same time,
+        'photos/2012/a.jpg' is copied to 'archive/2012/a.jpg' from the prefix 'photos/' to 'archive/' eg.
+        
+        :param src_prefix: the prefix of the objects to copy.
+        :param prefix: the prefix replacing src_prefix in the new objects' names.
+        :param concurrency: how many objects are copied at the same time.
+        :param multipart_size: the objects larger than it are copied by 'copy_object_multipart'.
+        
+        If the destination is under the source in the same bucket, 'p/' to 'p/new/' eg.,
+        the objects under the destination are skipped, they include the new objects listed while copying.
+        S3Error is raised if the destination is the source, each object would be copied onto itself.
+        
+        :return: the count of the objects copied, and the list of (S3ObjectSummary, error) failed.
+        '''
+
+        if bucket_name == src_bucket_name and prefix == src_prefix:
+            raise S3Error(-1, msg='The objects under %s of bucket %s can\'t be copied onto themselves.'
+                                  % (prefix, bucket_name))
+
+        nested = bucket_name == src_bucket_name and prefix.startswith(src_prefix)
+
+        def _iter_sources():
+            for summary in self.iter_objects(src_bucket_name, prefix=src_prefix):
+                if nested and summary.key.startswith(prefix):
+                    continue
+                yield summary, 0
+
+        def _copy(summary):
+            obj_name = prefix + summary.key[len(src_prefix):]
+            if summary.size > multipart_size:
+                self.copy_object_multipart(src_bucket_name, summary.key, bucket_name, obj_name,
+                                           metadata_directive=metadata_directive, amz_headers=amz_headers)
+            else:
+                self.copy_object(src_bucket_name, summary.key, bucket_name, obj_name,
+                                 metadata_directive=metadata_directive, amz_headers=amz_headers)
+
+        pipeline = Pipeline(_copy, workers=concurrency, max_items=concurrency * 4)
+        return pipeline.run(_iter_sources())
+
     def upload_file(self, filename, bucket_name, obj_name, x_amz_acl=X_AMZ_ACL.private,
-                    encrypt=False, encrypt_func=None):
+                    encrypt=False, encrypt_func=None, multipart=False,
+                    part_size=PART_SIZE, concurrency=4):
         '''
         Upload a local file to the Amazon S3.
         
@@ -708,43 +1757,181 @@ class S3Client(object):
         
         The properties of X_AMZ_ACL stand for acl list above, X_AMZ_ACL.private eg.
         But notice that the '-' must be replaced with '_', X_AMZ_ACL.public_read eg.
+        
+        If multipart, a file larger than part_size is uploaded in parts,
+        and the parts are uploaded by concurrency threads at the same time.
         '''
 
+        transform = None
+        if encrypt and encrypt_func is not None:
+            transform = lambda chunks: [encrypt_func(''.join(chunks))]
+
+        self._upload_file(filename, bucket_name, obj_name, x_amz_acl, transform,
+                          multipart, part_size, concurrency)
+
+    def _upload_file(self, filename, bucket_name, obj_name, x_amz_acl, transform=None,
+                     multipart=False, part_size=PART_SIZE, concurrency=4):
+        # transform takes the iterator of the file's chunks, and returns an iterator of
+        # the chunks to upload, which are spooled to know the size before uploaded.
         fp = open(filename, 'rb')
         try:
             amz_headers = {}
             if x_amz_acl != X_AMZ_ACL.private:
                 amz_headers['acl'] = x_amz_acl
 
-            data = fp.read()
-            if encrypt and encrypt_func is not None:
-                data = encrypt_func(data)
+            data = fp
+            if transform is not None:
+                chunks = iter(lambda: fp.read(self.chunk_size), '')
+                data = spool(transform(chunks), self.chunk_size)[0]
+
+            try:
+                data.seek(0, 2)
+                size = data.tell()
+                data.seek(0)
+
+                if multipart and size > part_size:
+                    self.put_object_multipart(bucket_name, obj_name, data, size=size,
+                                              part_size=part_size, concurrency=concurrency,
+                                              amz_headers=amz_headers)
+                else:
+                    self.put_object(bucket_name, obj_name, data, amz_headers=amz_headers)
+            finally:
+                if data is not fp:
+                    data.close()
+        finally:
+            fp.close()
+
+    def _download_range(self, filename, bucket_name, obj_name, byte_range, etag):
+        start, end = byte_range
 
-            self.put_object(bucket_name, obj_name, data, amz_headers=amz_headers)
+        fp = open(filename, 'r+b')
+        try:
+            tries = 0
+            while True:
+                tries += 1
+                # If-Match makes sure all the ranges come from the same version of the object.
+                obj = self.get_object_stream(bucket_name, obj_name, byte_range=(start, end),
+                                             headers={'If-Match': etag})
+                fp.seek(start)
+                try:
+                    for chunk in obj.stream:
+                        fp.write(chunk)
+                        start += len(chunk)
+                except (socket.error, httplib.HTTPException):
+                    if tries >= self.retry_policy.max_tries:
+                        raise
+                finally:
+                    obj.stream.close()
+
+                if start > end:
+                    return
+                if tries >= self.retry_policy.max_tries:
+                    raise S3Error(-1, msg='The range %d-%d of %s is incomplete.' % (byte_range[0], end, obj_name))
+                # get the rest of the range only.
+                time.sleep(self.retry_policy.get_interval(tries))
         finally:
             fp.close()
 
+    def _download_file_parallel(self, filename, bucket_name, obj_name, part_size, concurrency):
+        # the first range tells the size of the object.
+        fp = open(filename, 'wb')
+        try:
+            try:
+                obj = self.get_object_stream(bucket_name, obj_name, byte_range=(0, part_size - 1))
+            except S3Error, e:
+                if e.err_no == 416: # the object is empty
+                    return
+                raise
+
+            written = 0
+            try:
+                for chunk in obj.stream:
+                    fp.write(chunk)
+                    written += len(chunk)
+            except (socket.error, httplib.HTTPException):
+                pass # the rest of the first range is downloaded again below.
+            finally:
+                obj.stream.close()
+
+            content_range = getattr(obj, 'content_range', None)
+            if content_range is None: # the whole content returned
+                return
+            size = int(content_range.rsplit('/', 1)[1])
+            fp.truncate(size)
+        finally:
+            fp.close()
+
+        ranges = []
+        if written < min(part_size, size):
+            ranges.append((written, min(part_size, size) - 1))
+        for start in range(part_size, size, part_size):
+            ranges.append((start, min(start + part_size, size) - 1))
+
+        pool = ThreadPool(concurrency)
+        try:
+            pool.map(lambda byte_range: self._download_range(filename, bucket_name, obj_name,
+                                                             byte_range, obj.etag),
+                     ranges)
+        finally:
+            pool.terminate()
+
     def download_file(self, filename, bucket_name, obj_name,
-                      decrypt=False, decrypt_func=None):
+                      decrypt=False, decrypt_func=None, parallel=False,
+                      part_size=PART_SIZE, concurrency=4):
         '''
         Download the object in Amazon S3 to the local file.
         
         :param filename: the absolute path of the local file.
         :param bucket_name: name of the bucket which file puts into.
         :param obj_name: the object's name, as the format: 'folder/file.txt' or 'file.txt'.
+
+        The content is written to the file chunk by chunk,
+        and checked with the object's ETag when it's the md5 of the content.
+        
+        If parallel, the object is split into ranges of part_size,
+        which are downloaded by concurrency threads at the same time, and written at their offsets.
+        Each range is retried on its own when failed, but the ETag is not checked.
+        parallel is ignored when decrypt.
         '''
 
-        fp = open(filename, 'wb')
-        try:
-            data = self.get_object(bucket_name, obj_name).data
+        if decrypt and decrypt_func is not None:
+            transform = lambda chunks: [decrypt_func(''.join(chunks))]
+            return self._download_file(filename, bucket_name, obj_name, transform)
+
+        if parallel:
+            return self._download_file_parallel(filename, bucket_name, obj_name,
+                                                part_size, concurrency)
+        self._download_file(filename, bucket_name, obj_name)
+
+    def _download_file(self, filename, bucket_name, obj_name, transform=None):
+        # transform takes the iterator of the downloaded chunks,
+        # and returns an iterator of the chunks to write.
+        hash_ = md5()
 
-            if decrypt and decrypt_func is not None:
-                data = decrypt_func(data)
+        def _hash_chunks(chunks):
+            for chunk in chunks:
+                hash_.update(chunk)
+                yield chunk
 
-            fp.write(data)
+        fp = open(filename, 'wb')
+        try:
+            obj = self.get_object_stream(bucket_name, obj_name)
+            try:
+                chunks = _hash_chunks(obj.stream)
+                if transform is not None:
+                    chunks = transform(chunks)
+                for chunk in chunks:
+                    fp.write(chunk)
+            finally:
+                obj.stream.close()
         finally:
             fp.close()
 
+        # the ETag of a multipart uploaded object is not the md5 of the content.
+        etag = getattr(obj, 'etag', '').strip('"')
+        if etag and '-' not in etag and etag != hash_.hexdigest():
+            raise S3Error(-1, msg='The content of %s downloaded mismatches the ETag.' % obj_name)
+
 class CryptoS3Client(S3Client):
     '''
     Almost like S3Client, but supports uploading and downloading files with crypto.
@@ -755,29 +1942,100 @@ class CryptoS3Client(S3Client):
     
     # call the Amazon S3 api
     client.upload_file('/local_path/file_name', 'my_bucket_name', 'my_folder/file_name') 
+    
+    If segment_size is set, the files are encrypted in the format of crypto.SegmentedDES,
+    the segments are crypted by a pool of processes, as many as processes,
+    and a range of the object can be got by 'get_object_range'.
+    The files uploaded in either format must be downloaded in the same format.
     '''
 
-    def __init__(self, access_key, secret_access_key, IV):
+    def __init__(self, access_key, secret_access_key, IV, segment_size=None, processes=None, **kwargs):
         self.IV = IV
         self.des = DES(IV)
+        self.segment_size = segment_size
+        self.processes = processes
 
-        super(CryptoS3Client, self).__init__(access_key, secret_access_key)
+        super(CryptoS3Client, self).__init__(access_key, secret_access_key, **kwargs)
 
     def set_crypto(self, IV):
         self.IV = IV
         self.des = DES(IV)
 
-    def upload_file(self, filename, bucket_name, obj_name, x_amz_acl=X_AMZ_ACL.private, encrypt=True):
+    def _get_segmented(self):
+        return SegmentedDES(self.IV, self.segment_size, self.processes)
+
+    def upload_file(self, filename, bucket_name, obj_name, x_amz_acl=X_AMZ_ACL.private, encrypt=True,
+                    multipart=False, part_size=PART_SIZE, concurrency=4):
+        '''
+        The file is encrypted chunk by chunk while read,
+        and spooled into a temporary file before uploaded.
+        '''
+
         if not hasattr(self, 'IV'):
             raise S3Error(-1, msg='You haven\'t set the IV(8 length)')
 
-        super(CryptoS3Client, self).upload_file(filename, bucket_name, obj_name, x_amz_acl,
-                                                encrypt, self.des.encrypt)
+        if not encrypt or not self.segment_size:
+            transform = self.des.encrypt_chunks if encrypt else None
+            return self._upload_file(filename, bucket_name, obj_name, x_amz_acl, transform,
+                                     multipart, part_size, concurrency)
+
+        segmented = self._get_segmented()
+        try:
+            self._upload_file(filename, bucket_name, obj_name, x_amz_acl, segmented.encrypt_chunks,
+                              multipart, part_size, concurrency)
+        finally:
+            segmented.close()
+
+    def download_file(self, filename, bucket_name, obj_name, decrypt=True,
+                      parallel=False, part_size=PART_SIZE, concurrency=4):
+        '''
+        The content is decrypted chunk by chunk while downloaded.
+        parallel is ignored when decrypt.
+        '''
 
-    def download_file(self, filename, bucket_name, obj_name, decrypt=True):
         if not hasattr(self, 'IV'):
             raise S3Error(-1, msg='You haven\'t set the IV(8 length)')
 
-        super(CryptoS3Client, self).download_file(filename, bucket_name, obj_name,
-                                                  decrypt, self.des.decrypt)
+        if not decrypt:
+            return super(CryptoS3Client, self).download_file(filename, bucket_name, obj_name,
+                                                             parallel=parallel, part_size=part_size,
+                                                             concurrency=concurrency)
+        if not self.segment_size:
+            return self._download_file(filename, bucket_name, obj_name, self.des.decrypt_chunks)
+
+        segmented = self._get_segmented()
+        try:
+            self._download_file(filename, bucket_name, obj_name, segmented.decrypt_chunks)
+        finally:
+            segmented.close()
 
+    def get_object_range(self, bucket_name, obj_name, start, end):
+        '''
+        Get a range of the content of an object uploaded in the segmented format,
+        only the segments the range lies in are downloaded and decrypted.
+        
+        :param bucket_name: the bucket contains the object.
+        :param obj_name: the object's name, as the format: 'folder/file.txt' or 'file.txt'.
+        :param start: the start of the range in the content.
+        :param end: the end of the range in the content, included.
+        
+        :return: the content in the range.
+        '''
+
+        if not self.segment_size:
+            raise S3Error(-1, msg='The range can be got only when segment_size set.')
+
+        segmented = self._get_segmented()
+        try:
+            header = self.get_object(bucket_name, obj_name,
+                                     byte_range=(0, SEGMENT_HEADER_SIZE - 1)).data
+            segment_size = segmented.parse_header(header)
+
+            segments_range = segmented.get_segments_range(start, end, segment_size)
+            obj = self.get_object(bucket_name, obj_name, byte_range=segments_range)
+            size = int(obj.content_range.rsplit('/', 1)[1])
+            is_tail = segments_range[0] + len(obj.data) >= size
+
+            return segmented.decrypt_range(obj.data, start, end, is_tail, segment_size)
+        finally:
+            segmented.close()
@@ -27,10 +27,16 @@ from hashlib import sha256, sha1, md5
 from base64 import b64encode
 import time
 import mimetypes
+from tempfile import SpooledTemporaryFile
 try:
     from xml.etree.ElementTree import XMLTreeBuilder
 except ImportError:
     from elementtree.ElementTree import XMLTreeBuilder
+try:
+    from xml.etree.cElementTree import iterparse
+except ImportError:
+    from xml.etree.ElementTree import iterparse
+from cStringIO import StringIO
 
 from errors import CloudBackupLibError
 
@@ -50,6 +56,40 @@ def hmac_sha1(secret, data):
 def calc_md5(data):
     return b64encode(md5(data).digest())
 
+def calc_file_md5(fp, chunk_size=64*1024):
+    '''
+    Calculate the md5 of a seekable file-like object from it's current position,
+    reading chunk by chunk, and restore the position.
+    Return the md5 and the size of the content.
+    '''
+    pos = fp.tell()
+    hash_ = md5()
+    size = 0
+    while True:
+        chunk = fp.read(chunk_size)
+        if not chunk:
+            break
+        hash_.update(chunk)
+        size += len(chunk)
+    fp.seek(pos)
+    return b64encode(hash_.digest()), size
+
+def spool(chunks, max_size=64*1024):
+    '''
+    Write the chunks from an iterator into a temporary file,
+    which stays in memory until max_size reached, and calculate the md5 at the same time.
+    Return the rewound temporary file, the md5 and the size of the content.
+    '''
+    fp = SpooledTemporaryFile(max_size)
+    hash_ = md5()
+    size = 0
+    for chunk in chunks:
+        fp.write(chunk)
+        hash_.update(chunk)
+        size += len(chunk)
+    fp.seek(0)
+    return fp, b64encode(hash_.digest()), size
+
 def encode_multipart(kwargs, encrypt=False, encrypt_func=None):
     '''
     Build a multipart/form-data body with generated random boundary.
@@ -97,4 +137,31 @@ class XML(object):
     def loads(cls, data):
         parser = NamespaceFixXmlTreeBuilder()
         parser.feed(data)
-        return parser.close()
\ No newline at end of file
+        return parser.close()
+
+    @classmethod
+    def iterparse(cls, fp):
+        '''
+        Parse the xml while read from a file-like object, or a string,
+        and yield each child of the root as soon as it's closed, with the namespaces removed.
+        The child is dropped from the root after yielded, so the tree never grows.
+        '''
+
+        if isinstance(fp, basestring):
+            fp = StringIO(fp)
+
+        root = None
+        depth = 0
+        for event, elem in iterparse(fp, events=('start', 'end')):
+            if event == 'start':
+                if root is None:
+                    root = elem
+                depth += 1
+                continue
+
+            depth -= 1
+            if '}' in elem.tag:
+                elem.tag = elem.tag.split('}', 1)[1]
+            if depth == 1:
+                yield elem
+                root.clear()
\ No newline at end of file